@@ -0,0 +1,330 @@
+import asyncio
+import itertools
+import logging
+from random import randint
+from typing import Dict, List, Optional
+from codec import CODEC_JSON, SUPPORTED_CODECS, DecodeError, negotiate
+from framing import FrameTooLargeError, pack_message, read_message
+from matchmaking import DEFAULT_RATING, FifoPairingPolicy, PairingPolicy
+from player import DEFAULT_GAME_CONFIG, Field, GameConfig
+from rules import InvalidFleetError, Replies, Rules
+from server import Socket_address, TooManyPlayersError
+
+
+logging.basicConfig(level=logging.INFO,
+                    format='%(name)s: %(message)s',
+                    )
+
+
+class AsyncClient():
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, address: Socket_address, id: int = 0, field_backend=Field, game_config: GameConfig = DEFAULT_GAME_CONFIG):
+        self.__id: int = id
+        self.__reader: asyncio.StreamReader = reader
+        self.__writer: asyncio.StreamWriter = writer
+        self.__address: Socket_address = address
+        self.__field: Field = game_config.new_field(field_backend)
+        self.__rating: int = DEFAULT_RATING
+        # wire encoding used for messages sent to this client
+        self.__codec: str = CODEC_JSON
+
+    def getId(self) -> int:
+        return self.__id
+
+    def getReader(self) -> asyncio.StreamReader:
+        return self.__reader
+
+    def getWriter(self) -> asyncio.StreamWriter:
+        return self.__writer
+
+    def getAddress(self):
+        return self.__address
+
+    def getField(self):
+        return self.__field
+
+    def getRating(self):
+        return self.__rating
+
+    def getCodec(self):
+        return self.__codec
+
+    def setCodec(self, codec: str):
+        self.__codec = codec
+
+    def setRating(self, rating: int):
+        self.__rating = rating
+
+    def isConnected(self):
+        return not self.__writer.is_closing() and not self.__reader.at_eof()
+
+    async def send(self, message: dict):
+        self.__writer.write(pack_message(message, self.__codec))
+        await self.__writer.drain()
+
+    async def receive(self) -> Optional[dict]:
+        return await read_message(self.__reader)
+
+    def close(self):
+        if not self.__writer.is_closing():
+            self.__writer.close()
+
+
+class AsyncServer:
+    def __init__(self, server_address, backlog: int = 1024, pairing_policy: PairingPolicy = None, field_backend=Field, game_config: GameConfig = DEFAULT_GAME_CONFIG, authoritative: bool = False):
+        self.host = server_address[0]
+        self.port = server_address[1]
+        # player.Field or bitboard.BitboardField
+        self.field_backend = field_backend
+        # board and fleet of every game hosted here
+        self.game_config = game_config
+        # shots are resolved on the server's boards instead of by the defender
+        self.authoritative = authoritative
+        self.backlog = backlog
+        # connected clients keyed by connection id
+        self.__clients: Dict[int, AsyncClient] = dict()
+        self.__connection_ids = itertools.count(1)
+        self.__lobby: PairingPolicy = pairing_policy or FifoPairingPolicy()
+        self.games: List[AsyncGame] = list()
+        self.logger = logging.getLogger("AsyncServer")
+
+    def getClients(self):
+        return self.__clients
+
+    async def start(self):
+        server = await asyncio.start_server(
+            self.__handle_client, self.host, self.port,
+            backlog=self.backlog, reuse_address=True
+        )
+        self.logger.info(f"Listening on {self.host}:{self.port}")
+        async with server:
+            await server.serve_forever()
+
+    # lobby: a connection costs one coroutine until it is paired
+    async def __handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        peer = writer.get_extra_info("peername")
+        self.logger.info(f"Connection from client {peer[0]}:{peer[1]}")
+        new_client = AsyncClient(
+            reader, writer, Socket_address(peer[0], peer[1]),
+            next(self.__connection_ids), self.field_backend, self.game_config
+        )
+        self.__clients[new_client.getId()] = new_client
+        try:
+            await new_client.send(
+                {
+                    "type": "wait_for_opponent",
+                    "message": f"Server << Waiting for your opponent to join..",
+                    # clients answer with a hello message to pick one
+                    "codecs": SUPPORTED_CODECS
+                }
+            )
+        except (ConnectionError, OSError) as e:
+            self.logger.warning(f"Error handling client: {e}")
+            self._disconnect_client(new_client)
+            return
+
+        # the event loop is the matcher: every arrival gets one pairing attempt
+        self.__lobby.add(new_client)
+        pair = self.__lobby.pop_pair(self.__is_client_alive)
+        if pair is None:
+            return
+
+        player1, player2 = pair
+        new_game = AsyncGame(self)
+        new_game.addPlayer(player1)
+        new_game.addPlayer(player2)
+        self.games.append(new_game)
+        self.logger.info(
+            f"New game - Player {player1.getAddress().getIp()}:{player1.getAddress().getPort()} VS {player2.getAddress().getIp()}:{player2.getAddress().getPort()}")
+        asyncio.create_task(new_game.start_game())
+
+    def __is_client_alive(self, client: AsyncClient):
+        # dead lobby clients are dropped when the pairing skips them
+        if client.isConnected():
+            return True
+        self._disconnect_client(client)
+        return False
+
+    async def broadcast(self, message: dict, clients: List[AsyncClient]):
+        for client in clients:
+            try:
+                await client.send(message)
+            except (ConnectionError, OSError) as e:
+                self.logger.error(f"Error broadcasting to client: {e}")
+                self._disconnect_client(client)
+
+    def _disconnect_client(self, client: AsyncClient):
+        if self.__clients.pop(client.getId(), None) is not None:
+            self.logger.info(
+                f"{client.getAddress().getIp()}:{client.getAddress().getPort()} has disconnected")
+        client.close()
+
+
+class AsyncGame:
+    id = 0
+
+    def __init__(self, server: AsyncServer):
+        self.players: List[AsyncClient] = list()
+        self.gameServer = server
+        self.config: GameConfig = server.game_config
+        self.authoritative: bool = server.authoritative
+        self.__rules: Optional[Rules] = None
+        self.game_close_event = asyncio.Event()
+        self.logger = logging.getLogger("AsyncGame")
+        AsyncGame.id += 1
+        self.id = AsyncGame.id
+
+    def addPlayer(self, player: AsyncClient):
+        if len(self.players) < 2:
+            self.logger.info(f"Adding new player to the game N°{self.id}")
+            self.players.append(player)
+        else:
+            raise TooManyPlayersError(
+                f"Number of players inside Game N°{self.id} exceeded")
+
+    def getOpponent(self, client: AsyncClient) -> AsyncClient:
+        return self.players[1 - self.players.index(client)]
+
+    async def start_game(self):
+        player1, player2 = self.players
+        # choose the player who is gonna launch the first hit randomly
+        starting_client_turn = randint(0, 1)
+        self.__rules = Rules(self.config, self.authoritative,
+                             [player1.getField(), player2.getField()])
+        try:
+            await self.gameServer.broadcast(
+                {
+                    "type": "start_game",
+                    "config": self.config.to_message(),
+                    "authoritative": self.authoritative
+                },
+                [player1, player2]
+            )
+            players_coordinates = await asyncio.gather(
+                self.__handle_receive_coordinates(player1, 0, starting_client_turn),
+                self.__handle_receive_coordinates(player2, 1, starting_client_turn)
+            )
+            # send player's coordinates to the other player; the client draws the opponent's board
+            # from them, so even authoritative games reveal both fleets: a known limit of the protocol
+            if all(players_coordinates):
+                self.__rules.start(starting_client_turn)
+                await self.gameServer.broadcast(players_coordinates[0], [player2])
+                await self.gameServer.broadcast(players_coordinates[1], [player1])
+                await asyncio.gather(
+                    self.__handle_client(player1),
+                    self.__handle_client(player2)
+                )
+        finally:
+            self.game_close_event.set()
+            for player in self.players:
+                self.gameServer._disconnect_client(player)
+            self.gameServer.games.remove(self)
+
+    async def __handle_client(self, client: AsyncClient):
+        # handle incoming messages for each client
+        try:
+            while not self.game_close_event.is_set():
+                message = await client.receive()
+                if message is None:
+                    return
+                message_type = message["type"]
+                if message_type == "attack":
+                    self.logger.info(
+                        f"Received attack coordinates from player {client.getAddress().getPort()}")
+                    await self.__handle_receive_attack(client, message)
+                elif message_type == "attack_status":
+                    self.logger.info(
+                        f"Received attack status from player {client.getAddress().getPort()}")
+                    await self.__handle_receive_attack_status(client, message)
+                elif message_type == "hello":
+                    self.__handle_hello(client, message)
+                elif message_type == "close":
+                    self.gameServer._disconnect_client(client)
+                    return
+                elif message_type == "exit":
+                    await self.__handle_close(client)
+                    return
+        except (ConnectionError, OSError) as e:
+            self.logger.warning(f"Error handling client: {e}")
+            self.gameServer._disconnect_client(client)
+        except (DecodeError, FrameTooLargeError) as e:
+            self.logger.warning(f"Error: {e}")
+
+    async def __handle_receive_coordinates(self, client: AsyncClient, player_index: int, starting_client_turn: int):
+        try:
+            message = await client.receive()
+            # the codec negotiation answer comes before the fleet
+            while message is not None and message["type"] == "hello":
+                self.__handle_hello(client, message)
+                message = await client.receive()
+            if message is None:
+                return None
+            if message["type"] == "coordinates":
+                self.logger.info(
+                    f"Received coordinates from player {client.getAddress().getPort()}")
+                if self.__rules.isOver():
+                    # a rejected opponent has already ended the game
+                    return None
+                try:
+                    return self.__rules.place_fleet(player_index, message, starting_client_turn)
+                except InvalidFleetError as e:
+                    self.logger.warning(
+                        f"Rejected the fleet of player {client.getAddress().getPort()}: {e}")
+                    await self.__send_replies(self.__rules.reject_fleet(player_index))
+            elif message["type"] == "exit":
+                await self.__handle_close(client)
+            self.gameServer._disconnect_client(client)
+        except (ConnectionError, OSError, DecodeError, FrameTooLargeError) as e:
+            self.logger.warning(f"Error: {e}")
+        return None
+
+    def __handle_hello(self, client: AsyncClient, message):
+        client.setCodec(negotiate(message.get("codecs", [])))
+
+    async def __handle_receive_attack(self, client: AsyncClient, message):
+        replies = self.__rules.attack(self.players.index(client), message)
+        if replies is None:
+            self.logger.warning(
+                f"Ignored an attack out of turn from player {client.getAddress().getPort()}")
+            return
+        await self.__send_replies(replies)
+
+    async def __handle_receive_attack_status(self, client: AsyncClient, message):
+        await self.__send_replies(
+            self.__rules.attack_status(self.players.index(client), message))
+
+    async def __send_replies(self, replies: Replies):
+        for slot, reply in replies:
+            await self.players[slot].send(reply)
+        winner = self.__rules.getWinner()
+        if winner is not None and any(reply["type"] == "end_game" for _, reply in replies):
+            self.logger.info(
+                f"Game N°{self.id} --> {self.players[winner].getAddress().getPort()} has won the battle")
+
+    async def __handle_close(self, client: AsyncClient):
+        try:
+            await self.__send_replies(self.__rules.quit(self.players.index(client)))
+        except (ConnectionError, OSError) as e:
+            self.logger.warning(f"Error handling client: {e}")
+        self.gameServer._disconnect_client(client)
+
+
+def raise_open_files_limit():
+    # every idle lobby connection holds a file descriptor
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft != hard:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ImportError, ValueError, OSError):
+        pass
+
+
+if __name__ == "__main__":
+    raise_open_files_limit()
+    server = AsyncServer(("127.0.0.1", 12345))
+    try:
+        asyncio.run(server.start())
+    except KeyboardInterrupt:
+        logging.warning("Server has shut down.")
+    finally:
+        logging.info(f"Exiting...")
@@ -0,0 +1,194 @@
+# Many games at once: K pairs of boards as NumPy arrays, for balance testing fleets and win thresholds.
+# usage: python batch.py [--games N] [--chunk N] [--threshold N] [--seed N]
+import argparse
+from time import perf_counter
+from player import DEFAULT_GAME_CONFIG, SPLASH_OFFSETS, GameConfig
+
+try:
+    import numpy as np
+except ImportError:
+    # only this module needs it, the game itself runs without
+    np = None
+
+MAX_PLACEMENT_ROUNDS = 1000
+DEFAULT_CHUNK = 65536
+
+
+class BatchResult:
+    def __init__(self, starting, winners, turns, damaged_cells):
+        # per game: who fired first, 0/1 for the winner or -1 when undecided, shots fired
+        self.starting = starting
+        self.winners = winners
+        self.turns = turns
+        # [player, game] damaged cells at the end
+        self.damaged_cells = damaged_cells
+
+    def getGames(self):
+        return len(self.winners)
+
+    def getDraws(self) -> int:
+        return int((self.winners < 0).sum())
+
+    def getStarterWins(self) -> int:
+        return int((self.winners == self.starting).sum())
+
+    def getTotalTurns(self) -> int:
+        return int(self.turns.sum())
+
+
+class BatchGames:
+    def __init__(self, games: int, config: GameConfig = DEFAULT_GAME_CONFIG, rng=None):
+        if np is None:
+            raise ImportError("BatchGames needs numpy, pip install numpy")
+        self.__games = games
+        self.__config = config
+        self.__rng = rng if rng is not None else np.random.default_rng()
+        height, width = config.getHeight(), config.getWidth()
+        # [player, game, y, x]
+        self.__occupancy = np.zeros((2, games, height, width), dtype=bool)
+        self.__damage = np.zeros((2, games, height, width), dtype=bool)
+        # [player, game], kept up to date by fire() like Field's running totals
+        self.__damaged_cells = np.zeros((2, games), dtype=np.int32)
+
+    def getGames(self):
+        return self.__games
+
+    def getOccupancy(self):
+        return self.__occupancy
+
+    def getDamage(self):
+        return self.__damage
+
+    def getDamagedCells(self):
+        return self.__damaged_cells
+
+    def place_fleets(self):
+        # the configured fleet on every board, with Field.place_ship's bounds and no overlaps
+        boards = self.__occupancy.reshape(
+            -1, self.__config.getHeight(), self.__config.getWidth())
+        for ship in self.__config.getFleet():
+            self.__place_ship(boards, ship.getHeight(), ship.getWidth())
+
+    def __place_ship(self, boards, ship_height: int, ship_width: int):
+        height, width = boards.shape[1:]
+        # (columns, rows) covered when horizontal, then when vertical
+        shapes = ((ship_height, ship_width), (ship_width, ship_height))
+        # Field only takes anchors up to width - 1 and height - 1 (1-based)
+        limits = [
+            (min(width - 2, width - columns), min(height - 2, height - rows))
+            for columns, rows in shapes
+        ]
+        if all(max_x < 0 or max_y < 0 for max_x, max_y in limits):
+            raise ValueError(
+                f"A {ship_height}x{ship_width} ship does not fit on a {width}x{height} board")
+
+        # boards still without this ship, each round redraws them all at once
+        pending = np.arange(boards.shape[0])
+        for _ in range(MAX_PLACEMENT_ROUNDS):
+            if pending.size == 0:
+                return
+            vertical = self.__rng.random(pending.size) < 0.5
+            placed = np.zeros(pending.size, dtype=bool)
+            for orientation, (columns, rows), (max_x, max_y) in zip((~vertical, vertical), shapes, limits):
+                positions = np.flatnonzero(orientation)
+                if positions.size == 0 or max_x < 0 or max_y < 0:
+                    continue
+                x = self.__rng.integers(0, max_x + 1, positions.size)
+                y = self.__rng.integers(0, max_y + 1, positions.size)
+                board = pending[positions][:, None, None]
+                ys = y[:, None, None] + np.arange(rows)[None, :, None]
+                xs = x[:, None, None] + np.arange(columns)[None, None, :]
+                free = ~boards[board, ys, xs].any(axis=(1, 2))
+                boards[board[free], ys[free], xs[free]] = True
+                placed[positions[free]] = True
+            pending = pending[~placed]
+        raise ValueError("Could not place the fleet on every board")
+
+    def fire(self, defenders, games, hit_x, hit_y):
+        # one 1-based shot per listed game on its defender's board, same splash as Field.fire;
+        # returns which shots hit a ship
+        height, width = self.__config.getHeight(), self.__config.getWidth()
+        hits = np.zeros(len(games), dtype=bool)
+        for dx, dy in SPLASH_OFFSETS:
+            x = hit_x - 1 + dx
+            y = hit_y - 1 + dy
+            on_board = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+            player, game = defenders[on_board], games[on_board]
+            x, y = x[on_board], y[on_board]
+            occupied = self.__occupancy[player, game, y, x]
+            newly_damaged = occupied & ~self.__damage[player, game, y, x]
+            self.__damage[player, game, y, x] |= occupied
+            # a game appears once per call, so plain fancy-indexed += is safe
+            self.__damaged_cells[player, game] += newly_damaged
+            hits[on_board] |= occupied
+        return hits
+
+    def play(self, threshold: int = None) -> BatchResult:
+        # both players fire at shuffled cells until the server's end-of-game rule decides
+        if threshold is None:
+            threshold = self.__config.getWinThreshold()
+        width = self.__config.getWidth()
+        cells = self.__config.getHeight() * width
+        games = self.__games
+
+        order = np.tile(np.arange(cells, dtype=np.int32), (2, games, 1))
+        self.__rng.permuted(order, axis=2, out=order)
+        # like Game.start_game, a coin flip picks who fires first
+        starting = self.__rng.integers(0, 2, games)
+        winners = np.full(games, -1, dtype=np.int8)
+        turns = np.zeros(games, dtype=np.int32)
+
+        active = np.arange(games)
+        for turn in range(2 * cells):
+            if active.size == 0:
+                break
+            attackers = (starting[active] + turn) % 2
+            shots = order[attackers, active, turn // 2]
+            self.fire(1 - attackers, active, shots % width + 1, shots // width + 1)
+            turns[active] = turn + 1
+            damaged = self.__damaged_cells[:, active]
+            # Game.__end_game_if_over: once a board reaches the threshold the least damaged player wins
+            over = (damaged >= threshold).any(axis=0) & (damaged[0] != damaged[1])
+            winners[active[over]] = damaged[1, over] < damaged[0, over]
+            active = active[~over]
+        return BatchResult(starting, winners, turns, self.__damaged_cells.copy())
+
+
+def simulate(games: int, config: GameConfig = DEFAULT_GAME_CONFIG, threshold: int = None, chunk: int = DEFAULT_CHUNK, seed: int = None) -> dict:
+    # chunks keep the shot orders for millions of games out of memory at once
+    rng = np.random.default_rng(seed) if np is not None else None
+    totals = {"games": 0, "starter_wins": 0, "draws": 0, "turns": 0}
+    remaining = games
+    while remaining > 0:
+        batch = BatchGames(min(chunk, remaining), config, rng)
+        batch.place_fleets()
+        result = batch.play(threshold)
+        totals["games"] += result.getGames()
+        totals["starter_wins"] += result.getStarterWins()
+        totals["draws"] += result.getDraws()
+        totals["turns"] += result.getTotalTurns()
+        remaining -= result.getGames()
+    return totals
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type=int, default=1_000_000)
+    parser.add_argument("--chunk", type=int, default=DEFAULT_CHUNK)
+    parser.add_argument("--threshold", type=int,
+                        default=DEFAULT_GAME_CONFIG.getWinThreshold())
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    started = perf_counter()
+    totals = simulate(args.games, DEFAULT_GAME_CONFIG,
+                      args.threshold, args.chunk, args.seed)
+    elapsed = perf_counter() - started
+
+    decided = totals["games"] - totals["draws"]
+    print(f"games          {totals['games']} in {elapsed:.1f}s "
+          f"({totals['games'] / elapsed * 60:,.0f} games/min)")
+    print(f"threshold      {args.threshold} damaged cells")
+    print(f"first player   {totals['starter_wins'] / max(1, decided):.1%} of decided games")
+    print(f"undecided      {totals['draws']}")
+    print(f"shots per game {totals['turns'] / totals['games']:.1f}")
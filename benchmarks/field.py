@@ -0,0 +1,176 @@
+# Micro-benchmarks of the player.Field hot paths across board and fleet sizes.
+# usage: python -m benchmarks.field [--quick] [--save PATH] [--compare PATH] [--tolerance F]
+import argparse
+import contextlib
+import io
+import json
+import platform
+import random
+import sys
+import timeit
+from time import perf_counter
+from typing import Callable, Dict, List
+from player import Field, Ship
+
+# (board side, ships in the fleet)
+CASES = [(10, 3), (100, 3), (100, 50), (1000, 3), (1000, 500)]
+QUICK_CASES = [(10, 3), (100, 3), (100, 50)]
+# every ship gets a 4x4 slot, large enough for a 3x2 ship in either orientation
+SLOT = 4
+SHOTS = 1000
+REPEAT = 5
+DEFAULT_BASELINE = "benchmarks/field_baseline.json"
+DEFAULT_TOLERANCE = 0.5
+
+
+def build_fleet(side: int, ships: int) -> List[tuple]:
+    slots_per_row = (side - 1) // SLOT
+    if ships > slots_per_row * slots_per_row:
+        raise ValueError(f"{ships} ships do not fit on a {side}x{side} board")
+    fleet = []
+    for index in range(ships):
+        row, column = divmod(index, slots_per_row)
+        fleet.append((
+            f"S{index}",
+            (column * SLOT + 1, row * SLOT + 1),
+            'h' if index % 2 else 'v'
+        ))
+    return fleet
+
+
+def place_fleet(field: Field, fleet: List[tuple]) -> Field:
+    for name, place_coordinates, orientation in fleet:
+        field.place_ship(Ship(name, "X", 3, 2), place_coordinates, orientation)
+    return field
+
+
+def play_game(side: int, fleet: List[tuple], rng: random.Random) -> int:
+    # both players fire at shuffled cells until a whole fleet is sunk
+    fields = [place_fleet(Field(side, side), fleet) for _ in range(2)]
+    targets = [[(x, y) for x in range(1, side + 1) for y in range(1, side + 1)]
+               for _ in range(2)]
+    for cells in targets:
+        rng.shuffle(cells)
+    shots = 0
+    while True:
+        for turn in range(2):
+            x, y = targets[turn].pop()
+            fields[1 - turn].hit_ship(x, y)
+            shots += 1
+            if fields[1 - turn].is_defeated():
+                return shots
+
+
+def per_call(func: Callable[[], None], calls: int = 1) -> float:
+    # best of REPEAT autoranged runs, in seconds per call
+    timer = timeit.Timer(func)
+    loops, _ = timer.autorange()
+    return min(timer.repeat(REPEAT, loops)) / (loops * calls)
+
+
+def per_call_prepared(prepare: Callable[[], object], func: Callable[[object], None], calls: int = 1) -> float:
+    # like per_call, but every call gets its own prepare() result, built outside the timing
+    loops, _ = timeit.Timer(lambda: func(prepare())).autorange()
+    best = float("inf")
+    for _ in range(REPEAT):
+        prepared = [prepare() for _ in range(loops)]
+        started = perf_counter()
+        for item in prepared:
+            func(item)
+        best = min(best, perf_counter() - started)
+    return best / (loops * calls)
+
+
+def run_case(side: int, ships: int) -> Dict[str, float]:
+    rng = random.Random(0)
+    fleet = build_fleet(side, ships)
+    results = dict()
+
+    results["init"] = per_call(lambda: Field(side, side))
+    results["place_ship"] = per_call_prepared(
+        lambda: Field(side, side), lambda field: place_fleet(field, fleet), ships)
+
+    field = place_fleet(Field(side, side), fleet)
+    opponent = place_fleet(Field(side, side), fleet)
+    shots = [(rng.randint(1, side), rng.randint(1, side))
+             for _ in range(SHOTS)]
+
+    def fire():
+        for x, y in shots:
+            field.hit_ship(x, y)
+    results["hit_ship"] = per_call(fire, SHOTS)
+    results["count_damaged_coordinates"] = per_call(
+        field.count_damaged_coordinates)
+
+    placed = field.getShips()
+
+    def detect():
+        for ship in placed:
+            field.detect_ship_orientation(ship)
+    results["detect_ship_orientation"] = per_call(detect, ships)
+
+    def display():
+        with contextlib.redirect_stdout(io.StringIO()):
+            Field.display_fields(field, opponent)
+    results["display_fields"] = per_call(display)
+
+    # the same seed every repeat, so each one plays the same game
+    results["full_game"] = per_call(
+        lambda: play_game(side, fleet, random.Random(0)))
+    return results
+
+
+def run(cases) -> Dict[str, float]:
+    results = dict()
+    for side, ships in cases:
+        for name, seconds in run_case(side, ships).items():
+            results[f"{side}x{side}/{ships} ships/{name}"] = seconds
+    return results
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], tolerance: float) -> List[str]:
+    # names of the benchmarks that got slower than the baseline by more than `tolerance`
+    regressions = []
+    for name, seconds in results.items():
+        if name in baseline and seconds > baseline[name] * (1 + tolerance):
+            regressions.append(name)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--quick", action="store_true",
+                        help="skip the 1000x1000 boards")
+    parser.add_argument("--save", nargs="?", const=DEFAULT_BASELINE,
+                        help="write the results as the new baseline")
+    parser.add_argument("--compare", nargs="?", const=DEFAULT_BASELINE,
+                        help="fail when slower than the baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    baseline = dict()
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+
+    results = run(QUICK_CASES if args.quick else CASES)
+
+    print(f"{'benchmark':<48}{'us/call':>14}{'baseline':>14}")
+    for name, seconds in results.items():
+        before = f"{baseline[name] * 1e6:.2f}" if name in baseline else "-"
+        print(f"{name:<48}{seconds * 1e6:>14.2f}{before:>14}")
+
+    if args.save:
+        with open(args.save, "w") as baseline_file:
+            json.dump({
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "results": results
+            }, baseline_file, indent=2)
+            baseline_file.write("\n")
+
+    if args.compare:
+        regressions = compare(results, baseline, args.tolerance)
+        for name in regressions:
+            print(f"REGRESSION {name}: {results[name] / baseline[name]:.2f}x the baseline")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,180 @@
+# Headless load generator: many protocol-level bots playing full games against a running server.
+# usage: python -m benchmarks.loadgen [--port N] [--players N] [--rounds N] [--shot-delay S] [--codec binary|json] [--server-pid PID]
+import argparse
+import asyncio
+import random
+from time import perf_counter
+from typing import List
+from async_server import raise_open_files_limit
+from bot import random_placements
+from codec import CODEC_BINARY, CODEC_JSON, DecodeError, negotiate
+from framing import FrameTooLargeError, pack_message, read_message
+from player import DEFAULT_GAME_CONFIG, CoordinateTakenException, GameConfig
+
+
+class LoadStats:
+    def __init__(self):
+        self.players_finished = 0
+        self.errors = 0
+        self.messages_received = 0
+        # seconds between sending an attack and getting its status back
+        self.move_latencies: List[float] = []
+
+    def getGames(self):
+        return self.players_finished // 2
+
+
+async def play_game(host: str, port: int, stats: LoadStats, rng: random.Random, shot_delay: float, codec: str, timeout: float):
+    reader, writer = await asyncio.open_connection(host, port)
+    # until the server has offered codecs everything goes out as JSON
+    current_codec = CODEC_JSON
+    field = None
+    # random untried cells, drawn lazily so large boards cost nothing up front
+    fired = set()
+    fired_at = 0.0
+
+    async def send(message):
+        writer.write(pack_message(message, current_codec))
+        await writer.drain()
+
+    async def fire():
+        nonlocal fired_at
+        if len(fired) == field.getWidth() * field.getHeight():
+            raise IndexError("No cell left to fire at")
+        while True:
+            x = rng.randint(1, field.getWidth())
+            y = rng.randint(1, field.getHeight())
+            if (x, y) not in fired:
+                break
+        fired.add((x, y))
+        fired_at = perf_counter()
+        await send({"type": "attack", "coordinate": {"x": x, "y": y}})
+
+    try:
+        while True:
+            message = await asyncio.wait_for(read_message(reader), timeout)
+            if message is None:
+                # the server hung up before the game was over
+                stats.errors += 1
+                return
+            stats.messages_received += 1
+            message_type = message["type"]
+            if message_type == "wait_for_opponent":
+                if "codecs" in message and current_codec == CODEC_JSON and codec != CODEC_JSON:
+                    chosen = negotiate(message["codecs"], [codec])
+                    await send({"type": "hello", "codecs": [chosen]})
+                    current_codec = chosen
+            elif message_type == "start_game":
+                config = DEFAULT_GAME_CONFIG
+                if "config" in message:
+                    config = GameConfig.from_message(message["config"])
+                field = config.new_field()
+                await send({
+                    "type": "coordinates",
+                    "ships": random_placements(field, config.getFleet(), rng)
+                })
+            elif message_type == "coordinates":
+                if message["starting"]:
+                    await fire()
+            elif message_type == "attack":
+                status = field.hit_ship(
+                    message["coordinate"]["x"], message["coordinate"]["y"])
+                await send({
+                    "type": "attack_status",
+                    "status": int(status),
+                    "coordinate": message["coordinate"]
+                })
+            elif message_type == "attack_status":
+                stats.move_latencies.append(perf_counter() - fired_at)
+            elif message_type == "attack_result":
+                # authoritative servers: the defender's copy also hands over the turn
+                if message["your_turn"]:
+                    if shot_delay:
+                        await asyncio.sleep(shot_delay)
+                    await fire()
+                else:
+                    stats.move_latencies.append(perf_counter() - fired_at)
+            elif message_type == "launch_hit":
+                if shot_delay:
+                    await asyncio.sleep(shot_delay)
+                await fire()
+            elif message_type == "end_game":
+                stats.players_finished += 1
+                await send({"type": "close"})
+                return
+    except (OSError, asyncio.TimeoutError, DecodeError, FrameTooLargeError, IndexError, CoordinateTakenException):
+        stats.errors += 1
+    finally:
+        writer.close()
+
+
+async def run_player(host: str, port: int, stats: LoadStats, rounds: int, seed: int, shot_delay: float, codec: str, timeout: float):
+    rng = random.Random(seed)
+    for _ in range(rounds):
+        await play_game(host, port, stats, rng, shot_delay, codec, timeout)
+
+
+async def run_load(host: str, port: int, players: int, rounds: int, shot_delay: float, codec: str, timeout: float) -> LoadStats:
+    stats = LoadStats()
+    await asyncio.gather(*(
+        run_player(host, port, stats, rounds, seed,
+                   shot_delay, codec, timeout)
+        for seed in range(players)
+    ))
+    return stats
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def server_memory(pid: int) -> dict:
+    # current and peak resident set size in kB, Linux only
+    memory = dict()
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith(("VmRSS:", "VmHWM:")):
+                    name, value = line.split(":")
+                    memory[name] = int(value.split()[0])
+    except OSError:
+        pass
+    return memory
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=12345)
+    parser.add_argument("--players", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=1)
+    parser.add_argument("--shot-delay", type=float, default=0.0)
+    parser.add_argument("--codec", choices=(CODEC_BINARY, CODEC_JSON),
+                        default=CODEC_BINARY)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--server-pid", type=int)
+    args = parser.parse_args()
+
+    raise_open_files_limit()
+    started = perf_counter()
+    stats = asyncio.run(run_load(
+        args.host, args.port, args.players, args.rounds,
+        args.shot_delay, args.codec, args.timeout
+    ))
+    elapsed = perf_counter() - started
+
+    print(f"games      {stats.getGames()} in {elapsed:.2f}s "
+          f"({stats.getGames() / elapsed:.1f} games/s)")
+    print(f"moves      {len(stats.move_latencies)} "
+          f"p50 {percentile(stats.move_latencies, 0.5) * 1e3:.2f}ms "
+          f"p99 {percentile(stats.move_latencies, 0.99) * 1e3:.2f}ms")
+    print(f"messages   {stats.messages_received} received "
+          f"({stats.messages_received / max(1, len(stats.move_latencies)):.1f} per move)")
+    print(f"errors     {stats.errors}")
+    if args.server_pid is not None:
+        memory = server_memory(args.server_pid)
+        print(f"server rss {memory.get('VmRSS', '?')} kB "
+              f"(peak {memory.get('VmHWM', '?')} kB)")
@@ -0,0 +1,55 @@
+# Per-game memory footprint of the server side board state.
+# usage: python -m benchmarks.memory_footprint [--games N] [--side N]
+import argparse
+import tracemalloc
+from functools import partial
+from bitboard import BitboardField
+from player import Field, Ship
+from server import FIELD_HEIGHT, FIELD_WIDTH
+
+
+def default_fleet():
+    return [
+        (Ship("BB-67", "X", 6, 2), (1, 1), 'h'),
+        (Ship("FTR-88", "#", 4, 2), (1, 4), 'h'),
+        (Ship("MO201", "o", 3, 2), (1, 7), 'h'),
+    ]
+
+
+def build_game(field_backend, height: int, width: int):
+    # the server keeps one board per player
+    fields = []
+    for _ in range(2):
+        field = field_backend(height, width)
+        field.place_ships(default_fleet())
+        for x, y in ((1, 1), (4, 4), (7, 7)):
+            field.hit_ship(x, y)
+        fields.append(field)
+    return fields
+
+
+def measure(field_backend, games: int, height: int = FIELD_HEIGHT, width: int = FIELD_WIDTH) -> float:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [build_game(field_backend, height, width) for _ in range(games)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return (after - before) / games
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type=int, default=10000)
+    parser.add_argument("--side", type=int, default=FIELD_WIDTH)
+    args = parser.parse_args()
+
+    backends = (
+        ("Field", partial(Field, sparse=False)),
+        ("Field sparse", partial(Field, sparse=True)),
+        ("BitboardField", BitboardField),
+    )
+    print(f"{'backend':<16}{'bytes/game':>12}{'games/GiB':>14}")
+    for name, field_backend in backends:
+        per_game = measure(field_backend, args.games, args.side, args.side)
+        print(f"{name:<16}{per_game:>12.0f}{(1 << 30) / per_game:>14.0f}")
@@ -0,0 +1,52 @@
+# Render time and bytes written per turn, full frames against cell diffs.
+# usage: python -m benchmarks.render [--games N] [--turns N]
+import argparse
+import io
+import random
+from time import perf_counter
+from player import Field, FieldRenderer, Ship
+
+
+def build_field():
+    field = Field(10, 10)
+    field.place_ships([
+        (Ship("BB-67", "X", 6, 2), (1, 1), 'h'),
+        (Ship("FTR-88", "#", 4, 2), (1, 4), 'h'),
+        (Ship("MO201", "o", 3, 2), (1, 7), 'v'),
+    ])
+    return field
+
+
+def play(renderer: FieldRenderer, games: int, turns: int, seed: int = 0):
+    rng = random.Random(seed)
+    elapsed = 0
+    written = 0
+    for _ in range(games):
+        player_field, opponent_field = build_field(), build_field()
+        # the first frame of a game is a full redraw, keep it out of the per-turn numbers
+        renderer.reset()
+        renderer.render(player_field, opponent_field)
+        bytes_before = renderer.getBytesWritten()
+        started = perf_counter()
+        for turn in range(turns):
+            target = player_field if turn % 2 else opponent_field
+            target.hit_ship(rng.randint(1, 10), rng.randint(1, 10))
+            renderer.render(player_field, opponent_field)
+        elapsed += perf_counter() - started
+        written += renderer.getBytesWritten() - bytes_before
+    return elapsed / (games * turns), written / (games * turns)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=40)
+    args = parser.parse_args()
+
+    print(f"{'mode':<8}{'us/turn':>10}{'bytes/turn':>12}")
+    for mode, diff in (("full", False), ("diff", True)):
+        renderer = FieldRenderer(
+            io.StringIO(), diff=diff, terminal_size=(200, 60)
+        )
+        seconds, written = play(renderer, args.games, args.turns)
+        print(f"{mode:<8}{seconds * 1e6:>10.1f}{written:>12.0f}")
@@ -0,0 +1,197 @@
+from typing import List, Tuple
+from placements import rectangle_mask, ship_span
+from player import DEFAULT_SIGN, SPLASH_OFFSETS, Coordinate, CoordinateTakenException, HitResult, InconsistentCoordinatesException, Ship
+
+
+class BitboardField:
+    # same public API as player.Field, cell (x, y) is bit y * width + x
+    __slots__ = ("__height", "__width", "__occupancy", "__damage",
+                 "__ships", "__ship_cells", "__damaged_cells")
+
+    def __init__(self, height: int, width: int):
+        self.__height: int = height
+        self.__width: int = width
+        self.__occupancy: int = 0
+        self.__damage: int = 0
+        self.__ships: List[Tuple[Ship, int]] = []
+        self.__ship_cells: int = 0
+        self.__damaged_cells: int = 0
+
+    def getHeight(self):
+        return self.__height
+
+    def getWidth(self):
+        return self.__width
+
+    def getOccupancy(self) -> int:
+        return self.__occupancy
+
+    def getDamage(self) -> int:
+        return self.__damage
+
+    def getShipMasks(self) -> List[Tuple[Ship, int]]:
+        return self.__ships
+
+    def __bit(self, x: int, y: int) -> int:
+        return 1 << (y * self.__width + x)
+
+    def __cell(self, mask: int) -> Tuple[int, int]:
+        # coordinates of the lowest set bit
+        return divmod((mask & -mask).bit_length() - 1, self.__width)[::-1]
+
+    def getShips(self):
+        # built on demand in the same shape as player.Field.getShips()
+        ships = []
+        for ship, mask in self.__ships:
+            coordinates = []
+            remaining = mask
+            while remaining:
+                x, y = self.__cell(remaining)
+                coordinate = Coordinate(x, y)
+                if self.__damage & self.__bit(x, y):
+                    coordinate.setDamaged()
+                coordinates.append(coordinate)
+                remaining &= remaining - 1
+            ships.append({
+                "ship": ship,
+                "coordinates": coordinates
+            })
+        return ships
+
+    def getCell(self, x: int, y: int) -> tuple[str, bool]:
+        bit = self.__bit(x, y)
+        if not self.__occupancy & bit:
+            return DEFAULT_SIGN, False
+        for ship, mask in self.__ships:
+            if mask & bit:
+                return ship.getSign(), bool(self.__damage & bit)
+
+    def __validate_placement(self, ship: Ship, place_coordinates: tuple((int, int)), orientation: ['v', 'h'], reserved: int) -> Tuple[int, int, int]:
+        # Validate coordinates
+        if not (1 <= place_coordinates[0] < self.__width) or not (1 <= place_coordinates[1] < self.__height):
+            raise InconsistentCoordinatesException(
+                f"Coordinate out of bounds: ({place_coordinates[0]}, {place_coordinates[1]})")
+        x, y = place_coordinates[0] - 1, place_coordinates[1] - 1
+
+        columns, rows = ship_span(ship.getHeight(), ship.getWidth(), orientation)
+
+        if not (x + columns <= self.__width and y + rows <= self.__height):
+            # Ship overflows the grid
+            raise InconsistentCoordinatesException(
+                f"Ship placement out of range: ({x}..{x + columns}, {y}..{y + rows})")
+
+        mask = rectangle_mask(x, y, columns, rows, self.__width)
+        taken = mask & (self.__occupancy | reserved)
+        if taken:
+            taken_x, taken_y = self.__cell(taken)
+            raise CoordinateTakenException(
+                f"Coordinate ({taken_x + 1}, {taken_y + 1}) is already taken")
+        return mask, columns, rows
+
+    def __land_ship(self, ship: Ship, orientation: ['v', 'h'], mask: int, columns: int, rows: int):
+        if orientation == 'v':
+            ship.setHeight(columns)
+            ship.setWidth(rows)
+        self.__occupancy |= mask
+        self.__ship_cells += columns * rows
+        self.__ships.append((ship, mask))
+
+    def place_ship(self, ship: Ship, place_coordinates: tuple((int, int)), orientation: ['v', 'h']):
+        placement = self.__validate_placement(
+            ship, place_coordinates, orientation, 0
+        )
+        self.__land_ship(ship, orientation, *placement)
+
+    def place_ships(self, placements: List[Tuple[Ship, Tuple[int, int], str]]):
+        # the whole fleet is validated before anything lands, a failure leaves the field untouched
+        reserved = 0
+        fleet = []
+        for ship, place_coordinates, orientation in placements:
+            placement = self.__validate_placement(
+                ship, place_coordinates, orientation, reserved
+            )
+            reserved |= placement[0]
+            fleet.append((ship, orientation, placement))
+        for ship, orientation, placement in fleet:
+            self.__land_ship(ship, orientation, *placement)
+
+    def to_snapshot(self) -> List[list]:
+        # same layout as player.Field.to_snapshot
+        snapshot = []
+        for ship, mask in self.__ships:
+            x, y = self.__cell(mask)
+            columns, rows = ship.getHeight(), ship.getWidth()
+            damage = 0
+            if mask & self.__damage:
+                for dx in range(columns):
+                    for dy in range(rows):
+                        if self.__damage & self.__bit(x + dx, y + dy):
+                            damage |= 1 << (dx * rows + dy)
+            snapshot.append([
+                ship.getName(), ship.getSign(), columns, rows, x, y, damage
+            ])
+        return snapshot
+
+    def restore(self, snapshot: List[list]):
+        self.place_ships([
+            (Ship(name, sign, columns, rows), (x + 1, y + 1), 'h')
+            for name, sign, columns, rows, x, y, _ in snapshot
+        ])
+        for _, _, columns, rows, x, y, damage in snapshot:
+            for dx in range(columns):
+                for dy in range(rows):
+                    if damage >> (dx * rows + dy) & 1:
+                        bit = self.__bit(x + dx, y + dy)
+                        if not self.__damage & bit:
+                            self.__damage |= bit
+                            self.__damaged_cells += 1
+
+    def __splash(self, x: int, y: int) -> int:
+        # the hit cell and its four diagonal neighbours that are on the board
+        mask = 0
+        for dx, dy in SPLASH_OFFSETS:
+            if 0 <= x + dx < self.__width and 0 <= y + dy < self.__height:
+                mask |= self.__bit(x + dx, y + dy)
+        return mask
+
+    def fire(self, hit_x: int, hit_y: int) -> HitResult:
+        hit = self.__splash(hit_x - 1, hit_y - 1) & self.__occupancy
+        if not hit:
+            return HitResult(HitResult.MISS)
+        newly_damaged = hit & ~self.__damage
+        self.__damage |= hit
+        self.__damaged_cells += newly_damaged.bit_count()
+        hit_ships = []
+        sunk = []
+        # only reached on a hit: one AND per ship
+        for ship, mask in self.__ships:
+            if mask & hit:
+                hit_ships.append(ship.getName())
+                if mask & newly_damaged and mask & self.__damage == mask:
+                    sunk.append(ship.getName())
+        return HitResult(
+            HitResult.SUNK if sunk else HitResult.HIT, sunk or hit_ships
+        )
+
+    def hit_ship(self, hit_x: int, hit_y: int) -> bool:
+        return self.fire(hit_x, hit_y).is_hit()
+
+    def count_damaged_coordinates(self) -> int:
+        return self.__damaged_cells
+
+    def remaining_cells(self) -> int:
+        return self.__ship_cells - self.__damaged_cells
+
+    def is_defeated(self, max_damaged_coordinates: int = None) -> bool:
+        # without a threshold the whole fleet has to be destroyed
+        if max_damaged_coordinates is None:
+            return self.__ship_cells > 0 and self.remaining_cells() == 0
+        return self.__damaged_cells >= max_damaged_coordinates
+
+    def detect_ship_orientation(self, ship):
+        x_axis = [coordinate.getX() for coordinate in ship["coordinates"]]
+        y_axis = [coordinate.getY() for coordinate in ship["coordinates"]]
+        if max(x_axis) - min(x_axis) > max(y_axis) - min(y_axis):
+            return 'h'
+        else:
+            return 'v'
@@ -0,0 +1,322 @@
+import logging
+import random
+import selectors
+import socket
+from typing import Dict, List, Optional
+from codec import CODEC_BINARY, CODEC_JSON, DecodeError
+from framing import RECV_SIZE, FrameReader, FrameTooLargeError, pack_message, unpack_message
+from placements import orientations, placement_cells
+from player import DEFAULT_GAME_CONFIG, SPLASH_OFFSETS, CoordinateTakenException, Field, GameConfig, Ship
+from selector_loop import SelectorLoop
+
+logging.basicConfig(level=logging.INFO,
+                    format='%(name)s: %(message)s',
+                    )
+
+# one placement through an earlier hit outweighs this many untouched ones
+TARGET_WEIGHT = 1000
+# the density tables grow with the cells times the fleet's placements, larger boards are hunted at random
+DENSITY_AREA = 2500
+
+
+def enumerate_placements(height: int, width: int, ship_height: int, ship_width: int) -> List[tuple]:
+    # every slot Field.place_ship accepts for the ship, as flat cell indexes y * width + x
+    return [
+        placement
+        for orientation in orientations(ship_height, ship_width)
+        for placement in placement_cells(height, width, ship_height, ship_width, orientation)
+    ]
+
+
+class DensityTargeter:
+    # hunt/target shot picker over how many fleet placements still fit each cell of the opponent's field;
+    # each shot only touches the placements running through its splash instead of enumerating again
+    def __init__(self, config: GameConfig = DEFAULT_GAME_CONFIG, rng: random.Random = None):
+        self.__height = height = config.getHeight()
+        self.__width = width = config.getWidth()
+        self.__rng = rng or random.Random()
+        cells = height * width
+
+        # on-board cells of a shot at each cell, also the shots whose splash reaches it
+        self.__splash_cells: List[List[int]] = [
+            [
+                (y + dy) * width + x + dx
+                for dx, dy in SPLASH_OFFSETS
+                if 0 <= x + dx < width and 0 <= y + dy < height
+            ]
+            for y in range(height) for x in range(width)
+        ]
+        self.__placements: List[tuple] = []
+        # placement indexes of each ship name, ruled out together once it is sunk
+        self.__ship_placements: Dict[str, List[range]] = dict()
+        self.__covering: List[List[int]] = [[] for _ in range(cells)]
+        self.__density: List[int] = [0] * cells
+        for ship in config.getFleet():
+            first = len(self.__placements)
+            for placement in enumerate_placements(height, width, ship.getHeight(), ship.getWidth()):
+                for cell in placement:
+                    self.__covering[cell].append(len(self.__placements))
+                    self.__density[cell] += 1
+                self.__placements.append(placement)
+            self.__ship_placements.setdefault(ship.getName(), []).append(
+                range(first, len(self.__placements)))
+        # 1 while a placement still fits what the shots told
+        self.__alive = bytearray([1]) * len(self.__placements)
+        # cells some splash already reached: empty or damaged, nothing left to gain there
+        self.__splashed = bytearray(cells)
+        self.__fired = bytearray(cells)
+        # splash cells of the shots that hit, newest last
+        self.__hit_groups: List[List[int]] = []
+        # density of the cells a shot would reach for the first time
+        self.__score: List[int] = [
+            sum(self.__density[cell] for cell in self.__splash_cells[center])
+            for center in range(cells)
+        ]
+
+    def getDensity(self, x: int, y: int) -> int:
+        return self.__density[(y - 1) * self.__width + x - 1]
+
+    def getShotsLeft(self) -> int:
+        return len(self.__fired) - sum(self.__fired)
+
+    def __mark_splashed(self, cell: int):
+        if self.__splashed[cell]:
+            return
+        self.__splashed[cell] = 1
+        for center in self.__splash_cells[cell]:
+            self.__score[center] -= self.__density[cell]
+
+    def __rule_out(self, placement: int):
+        if not self.__alive[placement]:
+            return
+        self.__alive[placement] = 0
+        for cell in self.__placements[placement]:
+            self.__density[cell] -= 1
+            if not self.__splashed[cell]:
+                for center in self.__splash_cells[cell]:
+                    self.__score[center] -= 1
+
+    def record(self, x: int, y: int, hit: bool, sunk: List[str] = None):
+        # outcome of our shot at (x, y), 1-based, with the names of the ships it sank if known
+        center = (y - 1) * self.__width + x - 1
+        self.__fired[center] = 1
+        cells = self.__splash_cells[center]
+        for cell in cells:
+            self.__mark_splashed(cell)
+        if hit:
+            self.__hit_groups.append(cells)
+        else:
+            # a miss empties the whole splash
+            for cell in cells:
+                for placement in self.__covering[cell]:
+                    self.__rule_out(placement)
+        for name in sunk or []:
+            ranges = self.__ship_placements.get(name)
+            if ranges:
+                for placement in ranges.pop(0):
+                    self.__rule_out(placement)
+
+    def __target(self) -> Dict[int, int]:
+        # untouched cells of the placements through the newest hit that still has any,
+        # spent hits are dropped on the way
+        while self.__hit_groups:
+            bonus: Dict[int, int] = dict()
+            for cell in self.__hit_groups[-1]:
+                for placement in self.__covering[cell]:
+                    if not self.__alive[placement]:
+                        continue
+                    for other in self.__placements[placement]:
+                        if not self.__splashed[other]:
+                            bonus[other] = bonus.get(other, 0) + 1
+            if bonus:
+                return bonus
+            self.__hit_groups.pop()
+        return dict()
+
+    def next_shot(self) -> tuple[int, int]:
+        bonus = self.__target()
+        if bonus:
+            candidates = {
+                center for cell in bonus for center in self.__splash_cells[cell]
+                if not self.__fired[center]
+            }
+        else:
+            candidates = [
+                center for center in range(len(self.__fired))
+                if not self.__fired[center]
+            ]
+        if not candidates:
+            raise IndexError("No cell left to fire at")
+
+        best_score = -1
+        best: List[int] = []
+        for center in candidates:
+            score = self.__score[center]
+            if bonus:
+                score += TARGET_WEIGHT * sum(
+                    bonus.get(cell, 0) for cell in self.__splash_cells[center])
+            if score > best_score:
+                best_score = score
+                best = [center]
+            elif score == best_score:
+                best.append(center)
+        y, x = divmod(self.__rng.choice(best), self.__width)
+        return x + 1, y + 1
+
+
+class RandomTargeter:
+    # untried cells drawn at random, nothing kept but the shots fired
+    def __init__(self, config: GameConfig = DEFAULT_GAME_CONFIG, rng: random.Random = None):
+        self.__height = config.getHeight()
+        self.__width = config.getWidth()
+        self.__rng = rng or random.Random()
+        self.__fired = set()
+
+    def getShotsLeft(self) -> int:
+        return self.__height * self.__width - len(self.__fired)
+
+    def record(self, x: int, y: int, hit: bool, sunk: List[str] = None):
+        self.__fired.add((x, y))
+
+    def next_shot(self) -> tuple[int, int]:
+        if not self.getShotsLeft():
+            raise IndexError("No cell left to fire at")
+        while True:
+            shot = (self.__rng.randint(1, self.__width),
+                    self.__rng.randint(1, self.__height))
+            if shot not in self.__fired:
+                return shot
+
+
+def new_targeter(config: GameConfig, rng: random.Random = None):
+    if config.getHeight() * config.getWidth() > DENSITY_AREA:
+        return RandomTargeter(config, rng)
+    return DensityTargeter(config, rng)
+
+
+def random_placements(field: Field, fleet: List[Ship], rng: random.Random) -> List[dict]:
+    # lands a random fleet on the field and returns the ships of its coordinates message
+    return [
+        {
+            "name": ship.getName(),
+            "sign": ship.getSign(),
+            "height": ship.getHeight(),
+            "width": ship.getWidth(),
+            "x_start": x - 1,
+            "y_start": y - 1,
+            "orientation": orientation
+        }
+        for ship, (_, (x, y), orientation) in zip(fleet, field.auto_place(fleet, rng))
+    ]
+
+
+class Bot:
+    # the player side of the protocol for one game, every handled message returns the replies
+    def __init__(self, rng: random.Random = None):
+        self.__rng = rng or random.Random()
+        self.__codec = CODEC_JSON
+        self.__field: Optional[Field] = None
+        self.__targeter = None
+        self.__last_shot: Optional[tuple[int, int]] = None
+        self.__finished = False
+
+    def getCodec(self):
+        return self.__codec
+
+    def getTargeter(self):
+        return self.__targeter
+
+    def isFinished(self):
+        return self.__finished
+
+    def __fire(self) -> dict:
+        self.__last_shot = self.__targeter.next_shot()
+        x, y = self.__last_shot
+        return {"type": "attack", "coordinate": {"x": x, "y": y}}
+
+    def handle(self, message: dict) -> List[dict]:
+        message_type = message["type"]
+        if message_type == "wait_for_opponent":
+            # heartbeats offer the codecs again, only the first offer is answered
+            if "codecs" in message and self.__codec == CODEC_JSON and CODEC_BINARY in message["codecs"]:
+                self.__codec = CODEC_BINARY
+                return [{"type": "hello", "codecs": [CODEC_BINARY]}]
+        elif message_type == "start_game":
+            config = DEFAULT_GAME_CONFIG
+            if "config" in message:
+                config = GameConfig.from_message(message["config"])
+            self.__field = config.new_field()
+            self.__targeter = new_targeter(config, self.__rng)
+            return [{
+                "type": "coordinates",
+                "ships": random_placements(self.__field, config.getFleet(), self.__rng)
+            }]
+        elif message_type == "coordinates":
+            if message["starting"]:
+                return [self.__fire()]
+        elif message_type == "attack":
+            status = self.__field.hit_ship(
+                message["coordinate"]["x"], message["coordinate"]["y"])
+            return [{
+                "type": "attack_status",
+                "status": int(status),
+                "coordinate": message["coordinate"]
+            }]
+        elif message_type == "attack_status":
+            self.__targeter.record(*self.__last_shot, message["status"])
+        elif message_type == "launch_hit":
+            return [self.__fire()]
+        elif message_type == "attack_result":
+            if message["your_turn"]:
+                return [self.__fire()]
+            sunk = message["ships"] if message["result"] == "sunk" else None
+            self.__targeter.record(*self.__last_shot, message["status"], sunk)
+        elif message_type in ("end_game", "close"):
+            self.__finished = True
+            return [{"type": "close"}]
+        return []
+
+
+class BotRunner(SelectorLoop):
+    # plays every bot of a server from a single thread, each over its own socketpair
+    def __init__(self):
+        super().__init__("BotRunner")
+
+    def getBotCount(self):
+        # the wakeup socket is registered too
+        return len(self._selector.get_map()) - 1
+
+    def add(self, bot: Bot) -> socket.socket:
+        # returns the end the server talks to, as if the bot had connected
+        server_end, bot_end = socket.socketpair()
+        self._submit((bot_end, bot))
+        return server_end
+
+    def _on_submitted(self, item):
+        bot_end, bot = item
+        self._selector.register(
+            bot_end, selectors.EVENT_READ, (bot, FrameReader()))
+
+    def _on_ready(self, key: selectors.SelectorKey):
+        self.__play(key)
+
+    def _on_close(self):
+        for key in self._watched():
+            key.fileobj.close()
+
+    def __play(self, key: selectors.SelectorKey):
+        bot_end = key.fileobj
+        bot, frames = key.data
+        try:
+            data = bot_end.recv(RECV_SIZE)
+            if data:
+                for payload in frames.feed(data):
+                    for reply in bot.handle(unpack_message(payload)):
+                        bot_end.sendall(pack_message(reply, bot.getCodec()))
+                if not bot.isFinished():
+                    return
+        except (OSError, DecodeError, FrameTooLargeError, IndexError, ValueError, CoordinateTakenException) as e:
+            # only this bot leaves, the runner goes on with the others
+            self.logger.warning(f"Bot left its game: {e}")
+        self._selector.unregister(bot_end)
+        bot_end.close()
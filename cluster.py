@@ -0,0 +1,200 @@
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import selectors
+import socket
+import sys
+import threading
+from typing import List, Optional
+from matchmaking import Matchmaker, PairingPolicy
+from server import Client, Server, is_connected
+
+logging.basicConfig(level=logging.INFO,
+                    format='%(name)s: %(message)s',
+                    )
+
+# handoffs are a small JSON header with the connection descriptors attached
+MAX_HANDOFF_SIZE = 4096
+SELECT_TIMEOUT = 0.5
+
+
+class LobbyPlayer:
+    # a connection parked in the broker while it waits for an opponent
+    def __init__(self, sock: socket.socket, address, rating: int):
+        self.__socket = sock
+        self.__address = address
+        self.__rating = rating
+
+    def getSocket(self):
+        return self.__socket
+
+    def getAddress(self):
+        return self.__address
+
+    def getRating(self):
+        return self.__rating
+
+    def isConnected(self):
+        return is_connected(self.__socket)
+
+
+class Broker:
+    # single lobby shared by every worker, paired games are handed back round-robin
+    def __init__(self, channels: List[socket.socket], pairing_policy: PairingPolicy = None):
+        self.__channels = channels
+        self.__workers = itertools.cycle(range(len(channels)))
+        self.matchmaker = Matchmaker(
+            on_match=self.__dispatch,
+            policy=pairing_policy,
+            is_alive=self.__is_alive
+        )
+        self.close_event = threading.Event()
+        self.logger = logging.getLogger("Broker")
+
+    def run(self):
+        self.matchmaker.start()
+        selector = selectors.DefaultSelector()
+        for channel in self.__channels:
+            selector.register(channel, selectors.EVENT_READ)
+        while not self.close_event.is_set() and selector.get_map():
+            for key, _ in selector.select(SELECT_TIMEOUT):
+                data, fds, _, _ = socket.recv_fds(
+                    key.fileobj, MAX_HANDOFF_SIZE, 1)
+                if not data:
+                    # the worker has exited
+                    selector.unregister(key.fileobj)
+                    continue
+                header = json.loads(data)
+                self.matchmaker.enqueue(
+                    LobbyPlayer(
+                        socket.socket(fileno=fds[0]),
+                        tuple(header["address"]),
+                        header["rating"]
+                    )
+                )
+        self.matchmaker.stop()
+
+    def stop(self):
+        self.close_event.set()
+
+    def __is_alive(self, player: LobbyPlayer):
+        if player.isConnected():
+            return True
+        player.getSocket().close()
+        return False
+
+    def __dispatch(self, player1: LobbyPlayer, player2: LobbyPlayer):
+        channel = self.__channels[next(self.__workers)]
+        header = json.dumps({
+            "players": [
+                {"address": player.getAddress(), "rating": player.getRating()}
+                for player in (player1, player2)
+            ]
+        }).encode()
+        socket.send_fds(
+            channel, [header],
+            [player1.getSocket().fileno(), player2.getSocket().fileno()]
+        )
+        # the worker holds its own copy of both descriptors now
+        for player in (player1, player2):
+            player.getSocket().close()
+
+
+class BrokerLink:
+    # takes the place of a worker's Matchmaker, the lobby lives in the broker
+    def __init__(self, server: Server, channel: socket.socket):
+        self.__server = server
+        self.__channel = channel
+        self.__lock = threading.Lock()
+        self.__close_event = threading.Event()
+        self.__thread: Optional[threading.Thread] = None
+        self.logger = logging.getLogger("BrokerLink")
+
+    def getLobbySize(self):
+        return 0
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        self.__close_event.set()
+        self.__channel.shutdown(socket.SHUT_RDWR)
+
+    def enqueue(self, client: Client):
+        header = json.dumps({
+            "address": client.getAddress(),
+            "rating": client.getRating()
+        }).encode()
+        with self.__lock:
+            socket.send_fds(
+                self.__channel, [header], [client.getSocket().fileno()])
+        # the broker owns the connection until it is paired
+        self.__server.remove_client(client)
+        client.getSocket().close()
+
+    def __run(self):
+        while not self.__close_event.is_set():
+            try:
+                data, fds, _, _ = socket.recv_fds(
+                    self.__channel, MAX_HANDOFF_SIZE, 2)
+            except OSError as e:
+                self.logger.error(f"Error receiving from the broker: {e}")
+                return
+            if not data:
+                return
+            players = []
+            for fd, player in zip(fds, json.loads(data)["players"]):
+                client = self.__server.create_client(
+                    socket.socket(fileno=fd), tuple(player["address"]))
+                client.setRating(player["rating"])
+                players.append(client)
+            self.__server.start_match(*players)
+
+
+def run_worker(server_address, channel: socket.socket):
+    # lobby heartbeats are not sent, lobby sockets leave the worker right away
+    server = Server(server_address, threading.Event(), reuse_port=True)
+    server.matchmaker = BrokerLink(server, channel)
+    server.start()
+
+
+def start_cluster(server_address, workers: int = None, pairing_policy: PairingPolicy = None):
+    # every worker accepts on the same port with SO_REUSEPORT and runs its own games
+    workers = workers or os.cpu_count()
+    context = multiprocessing.get_context("fork")
+    channels = []
+    processes = []
+    for index in range(workers):
+        broker_end, worker_end = socket.socketpair(
+            socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        process = context.Process(
+            target=run_worker,
+            args=(server_address, worker_end),
+            name=f"Worker-{index + 1}",
+            daemon=True
+        )
+        process.start()
+        worker_end.close()
+        channels.append(broker_end)
+        processes.append(process)
+    logging.getLogger("Cluster").info(
+        f"{workers} workers listening on {server_address[0]}:{server_address[1]}")
+    broker = Broker(channels, pairing_policy)
+    try:
+        broker.run()
+    except KeyboardInterrupt:
+        broker.stop()
+    finally:
+        for process in processes:
+            process.terminate()
+        logging.info(f"Exiting...")
+
+
+if __name__ == "__main__":
+    start_cluster(
+        ("127.0.0.1", 12345),
+        int(sys.argv[1]) if len(sys.argv) > 1 else None
+    )
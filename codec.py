@@ -0,0 +1,164 @@
+import json
+import struct
+
+CODEC_JSON = "json"
+CODEC_BINARY = "binary"
+# preferred first, JSON is always understood
+SUPPORTED_CODECS = [CODEC_BINARY, CODEC_JSON]
+
+# binary payloads start with a message type byte, JSON payloads always start with "{"
+ATTACK = 1
+ATTACK_STATUS = 2
+LAUNCH_HIT = 3
+COORDINATES = 4
+ATTACK_RESULT = 5
+
+COORDINATE = struct.Struct("!BHH")
+STATUS = struct.Struct("!BBHH")
+FLEET = struct.Struct("!BbH")
+SHIP = struct.Struct("!HHHHc")
+RESULT = struct.Struct("!BBBBHHB")
+# same order as player.HitResult
+RESULTS = ["miss", "hit", "sunk"]
+NO_STARTING = -1
+
+
+class DecodeError(ValueError):
+    pass
+
+
+def _pack_text(text: str) -> bytes:
+    data = text.encode()
+    return struct.pack("!B", len(data)) + data
+
+
+def _unpack_text(payload: bytes, offset: int) -> tuple[str, int]:
+    length = payload[offset]
+    end = offset + 1 + length
+    return payload[offset + 1:end].decode(), end
+
+
+def _encode_fleet(message: dict) -> bytes:
+    starting = message.get("starting", NO_STARTING)
+    packed = [FLEET.pack(COORDINATES, starting, len(message["ships"]))]
+    for ship in message["ships"]:
+        if set(ship) != {"name", "sign", "height", "width", "x_start", "y_start", "orientation"}:
+            raise ValueError("unexpected ship fields")
+        packed.append(SHIP.pack(
+            ship["height"], ship["width"], ship["x_start"], ship["y_start"],
+            ship["orientation"].encode()
+        ))
+        packed.append(_pack_text(ship["name"]))
+        packed.append(_pack_text(ship["sign"]))
+    return b"".join(packed)
+
+
+def _decode_fleet(payload: bytes) -> dict:
+    _, starting, count = FLEET.unpack_from(payload)
+    offset = FLEET.size
+    ships = []
+    for _ in range(count):
+        height, width, x_start, y_start, orientation = SHIP.unpack_from(
+            payload, offset)
+        name, offset = _unpack_text(payload, offset + SHIP.size)
+        sign, offset = _unpack_text(payload, offset)
+        ships.append({
+            "name": name,
+            "sign": sign,
+            "height": height,
+            "width": width,
+            "x_start": x_start,
+            "y_start": y_start,
+            "orientation": orientation.decode()
+        })
+    message = {"type": "coordinates", "ships": ships}
+    if starting != NO_STARTING:
+        message["starting"] = starting
+    return message
+
+
+def _encode_result(message: dict) -> bytes:
+    packed = [RESULT.pack(
+        ATTACK_RESULT, message["status"], RESULTS.index(message["result"]),
+        message["your_turn"], message["coordinate"]["x"], message["coordinate"]["y"],
+        len(message["ships"])
+    )]
+    packed.extend(_pack_text(name) for name in message["ships"])
+    return b"".join(packed)
+
+
+def _decode_result(payload: bytes) -> dict:
+    _, status, result, your_turn, x, y, count = RESULT.unpack_from(payload)
+    offset = RESULT.size
+    ships = []
+    for _ in range(count):
+        name, offset = _unpack_text(payload, offset)
+        ships.append(name)
+    return {
+        "type": "attack_result",
+        "coordinate": {"x": x, "y": y},
+        "status": status,
+        "result": RESULTS[result],
+        "ships": ships,
+        "your_turn": your_turn
+    }
+
+
+def _encode_binary(message: dict) -> bytes:
+    # only the hot, fixed-shape messages are packed, anything else stays JSON
+    message_type = message["type"]
+    keys = set(message)
+    if "coordinate" in message and set(message["coordinate"]) != {"x", "y"}:
+        raise ValueError("unexpected coordinate fields")
+    if message_type == "attack" and keys == {"type", "coordinate"}:
+        return COORDINATE.pack(ATTACK, message["coordinate"]["x"], message["coordinate"]["y"])
+    if message_type == "attack_status" and keys == {"type", "status", "coordinate"}:
+        return STATUS.pack(ATTACK_STATUS, message["status"], message["coordinate"]["x"], message["coordinate"]["y"])
+    if message_type == "launch_hit" and keys == {"type"}:
+        return bytes([LAUNCH_HIT])
+    if message_type == "coordinates" and keys <= {"type", "ships", "starting"}:
+        return _encode_fleet(message)
+    if message_type == "attack_result" and keys == {"type", "coordinate", "status", "result", "ships", "your_turn"}:
+        return _encode_result(message)
+    raise ValueError(f"no binary layout for {message_type}")
+
+
+def encode_payload(message: dict, codec: str = CODEC_JSON) -> bytes:
+    if codec == CODEC_BINARY:
+        try:
+            return _encode_binary(message)
+        except (KeyError, TypeError, ValueError, struct.error):
+            pass
+    return json.dumps(message).encode()
+
+
+def decode_payload(payload: bytes) -> dict:
+    if not payload:
+        raise DecodeError("Empty payload")
+    message_type = payload[0]
+    try:
+        if message_type == ord("{"):
+            return json.loads(payload.decode())
+        if message_type == ATTACK:
+            _, x, y = COORDINATE.unpack(payload)
+            return {"type": "attack", "coordinate": {"x": x, "y": y}}
+        if message_type == ATTACK_STATUS:
+            _, status, x, y = STATUS.unpack(payload)
+            return {"type": "attack_status", "status": status, "coordinate": {"x": x, "y": y}}
+        if message_type == LAUNCH_HIT:
+            return {"type": "launch_hit"}
+        if message_type == COORDINATES:
+            return _decode_fleet(payload)
+        if message_type == ATTACK_RESULT:
+            return _decode_result(payload)
+    except (struct.error, IndexError, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise DecodeError(f"Malformed payload: {e}")
+    raise DecodeError(f"Unknown message type {message_type}")
+
+
+def negotiate(offered: list, supported: list = SUPPORTED_CODECS) -> str:
+    # first of our codecs the peer also speaks
+    for codec in supported:
+        if codec in offered:
+            return codec
+    return CODEC_JSON
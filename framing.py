@@ -0,0 +1,100 @@
+import asyncio
+import socket
+import struct
+from collections import deque
+from typing import List, Optional
+from codec import CODEC_JSON, decode_payload, encode_payload
+
+# every message on the wire is a 4 bytes big-endian payload length followed by the payload
+HEADER = struct.Struct("!I")
+# room for the coordinates message of about two thousand ships
+MAX_FRAME_SIZE = 256 * 1024
+RECV_SIZE = 4096
+
+
+class FrameTooLargeError(Exception):
+    pass
+
+
+def encode_frame(payload: bytes) -> bytes:
+    return HEADER.pack(len(payload)) + payload
+
+
+def pack_message(message: dict, codec: str = CODEC_JSON) -> bytes:
+    return encode_frame(encode_payload(message, codec))
+
+
+def unpack_message(payload: bytes) -> dict:
+    # JSON or binary, told apart by the first byte
+    return decode_payload(payload)
+
+
+class FrameReader:
+    def __init__(self, max_frame_size: int = MAX_FRAME_SIZE):
+        self.__buffer = bytearray()
+        self.__max_frame_size = max_frame_size
+
+    def getBufferedSize(self):
+        return len(self.__buffer)
+
+    def feed(self, data: bytes) -> List[bytes]:
+        # keep partial frames buffered and return every complete payload
+        buffer = self.__buffer
+        buffer += data
+        payloads = []
+        offset = 0
+        while len(buffer) - offset >= HEADER.size:
+            (length,) = HEADER.unpack_from(buffer, offset)
+            if length > self.__max_frame_size:
+                raise FrameTooLargeError(
+                    f"Frame of {length} bytes exceeds the {self.__max_frame_size} bytes limit")
+            end = offset + HEADER.size + length
+            if end > len(buffer):
+                break
+            payloads.append(bytes(buffer[offset + HEADER.size:end]))
+            offset = end
+        if offset:
+            del buffer[:offset]
+        return payloads
+
+
+class MessageReader:
+    def __init__(self, sock: socket.socket, max_frame_size: int = MAX_FRAME_SIZE):
+        self.__socket = sock
+        self.__frames = FrameReader(max_frame_size)
+        self.__pending: deque[dict] = deque()
+
+    def receive(self) -> Optional[dict]:
+        # block until a whole message is available, None once the peer has closed
+        while not self.__pending:
+            data = self.__socket.recv(RECV_SIZE)
+            if not data:
+                return None
+            self.__pending.extend(
+                unpack_message(payload) for payload in self.__frames.feed(data)
+            )
+        return self.__pending.popleft()
+
+    def receive_available(self) -> Optional[List[dict]]:
+        # single recv for select() driven loops, None once the peer has closed
+        messages = list(self.__pending)
+        self.__pending.clear()
+        data = self.__socket.recv(RECV_SIZE)
+        if not data:
+            return messages or None
+        messages.extend(
+            unpack_message(payload) for payload in self.__frames.feed(data)
+        )
+        return messages
+
+
+async def read_message(reader: asyncio.StreamReader, max_frame_size: int = MAX_FRAME_SIZE) -> Optional[dict]:
+    try:
+        header = await reader.readexactly(HEADER.size)
+        (length,) = HEADER.unpack(header)
+        if length > max_frame_size:
+            raise FrameTooLargeError(
+                f"Frame of {length} bytes exceeds the {max_frame_size} bytes limit")
+        return unpack_message(await reader.readexactly(length))
+    except asyncio.IncompleteReadError:
+        return None
@@ -0,0 +1,138 @@
+import logging
+import threading
+from collections import deque
+from typing import Callable, Dict, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO,
+                    format='%(name)s: %(message)s',
+                    )
+
+DEFAULT_RATING = 1000
+DEFAULT_RATING_BAND = 100
+
+
+class PairingPolicy:
+    def add(self, player) -> None:
+        raise NotImplementedError
+
+    def pop_pair(self, is_alive: Callable[[object], bool]) -> Optional[Tuple[object, object]]:
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+
+class FifoPairingPolicy(PairingPolicy):
+    def __init__(self):
+        self.__lobby: deque = deque()
+
+    def add(self, player):
+        self.__lobby.append(player)
+
+    def pop_pair(self, is_alive):
+        first = None
+        while self.__lobby:
+            player = self.__lobby.popleft()
+            # dead sockets are dropped as they reach the head of the queue
+            if not is_alive(player):
+                continue
+            if first is None:
+                first = player
+            else:
+                return first, player
+        if first is not None:
+            self.__lobby.appendleft(first)
+        return None
+
+    def __len__(self):
+        return len(self.__lobby)
+
+
+class RatingBandPairingPolicy(PairingPolicy):
+    def __init__(self, band_width: int = DEFAULT_RATING_BAND, get_rating: Callable[[object], int] = None):
+        self.__band_width = band_width
+        self.__get_rating = get_rating or (lambda player: player.getRating())
+        self.__bands: Dict[int, deque] = dict()
+        # bands that received a player since the last pairing attempt
+        self.__arrivals: deque = deque()
+        self.__size = 0
+
+    def add(self, player):
+        band = self.__get_rating(player) // self.__band_width
+        self.__bands.setdefault(band, deque()).append(player)
+        self.__arrivals.append(band)
+        self.__size += 1
+
+    def __pop_alive(self, band: int, is_alive):
+        lobby = self.__bands.get(band)
+        while lobby:
+            player = lobby.popleft()
+            self.__size -= 1
+            if is_alive(player):
+                return player
+        return None
+
+    def pop_pair(self, is_alive):
+        # a player is only paired inside its own band or with a neighbouring one
+        while self.__arrivals:
+            band = self.__arrivals.popleft()
+            first = self.__pop_alive(band, is_alive)
+            if first is None:
+                continue
+            for candidate_band in (band, band - 1, band + 1):
+                second = self.__pop_alive(candidate_band, is_alive)
+                if second is not None:
+                    return first, second
+            self.__bands[band].appendleft(first)
+            self.__size += 1
+        return None
+
+    def __len__(self):
+        return self.__size
+
+
+class Matchmaker:
+    def __init__(self, on_match: Callable[[object, object], None], policy: PairingPolicy = None, is_alive: Callable[[object], bool] = None):
+        self.__policy: PairingPolicy = policy or FifoPairingPolicy()
+        self.__on_match = on_match
+        self.__is_alive = is_alive or (lambda player: True)
+        self.__condition = threading.Condition()
+        self.__close_event = threading.Event()
+        self.__thread: Optional[threading.Thread] = None
+        self.logger = logging.getLogger("Matchmaker")
+
+    def getPolicy(self):
+        return self.__policy
+
+    def getLobbySize(self):
+        with self.__condition:
+            return len(self.__policy)
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        self.__close_event.set()
+        with self.__condition:
+            self.__condition.notify()
+
+    def enqueue(self, player):
+        # only wakes the matcher, pairing never runs on the caller's thread
+        with self.__condition:
+            self.__policy.add(player)
+            self.__condition.notify()
+
+    def __run(self):
+        while not self.__close_event.is_set():
+            with self.__condition:
+                pair = self.__policy.pop_pair(self.__is_alive)
+                while pair is None and not self.__close_event.is_set():
+                    self.__condition.wait()
+                    pair = self.__policy.pop_pair(self.__is_alive)
+            if pair is None:
+                return
+            try:
+                self.__on_match(*pair)
+            except Exception as e:
+                self.logger.error(f"Error starting a game: {e}")
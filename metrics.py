@@ -0,0 +1,222 @@
+import logging
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO,
+                    format='%(name)s: %(message)s',
+                    )
+
+# seconds, from sub-millisecond message handling up to long lobby waits
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in labels]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.lock = threading.Lock()
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}",
+                 f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help)
+        self.__values: Dict[tuple, int] = dict()
+
+    def inc(self, amount: int = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.__values[key] = self.__values.get(key, 0) + amount
+
+    def getValue(self, **labels):
+        return self.__values.get(tuple(sorted(labels.items())), 0)
+
+    def samples(self):
+        with self.lock:
+            values = list(self.__values.items())
+        return [f"{self.name}{_format_labels(key)} {_format_value(value)}" for key, value in values]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, function: Callable[[], float] = None):
+        super().__init__(name, help)
+        self.__value = 0
+        # read at scrape time when set
+        self.__function = function
+
+    def set(self, value):
+        self.__value = value
+
+    def setFunction(self, function: Callable[[], float]):
+        self.__function = function
+
+    def getValue(self):
+        return self.__function() if self.__function is not None else self.__value
+
+    def samples(self):
+        return [f"{self.name} {_format_value(self.getValue())}"]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help)
+        self.__buckets = tuple(buckets)
+        # label key -> [count per bucket (+Inf last), sum]
+        self.__series: Dict[tuple, list] = dict()
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.__series.get(key)
+            if series is None:
+                series = self.__series[key] = [
+                    [0] * (len(self.__buckets) + 1), 0.0]
+            series[0][bisect_left(self.__buckets, value)] += 1
+            series[1] += value
+
+    def getCount(self, **labels):
+        series = self.__series.get(tuple(sorted(labels.items())))
+        return sum(series[0]) if series is not None else 0
+
+    def samples(self):
+        with self.lock:
+            series = [(key, list(counts), total)
+                      for key, (counts, total) in self.__series.items()]
+        lines = []
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.__buckets + (float("inf"),), counts):
+                cumulative += count
+                bucket = _format_labels(key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{bucket} {cumulative}")
+            lines.append(
+                f"{self.name}_sum{_format_labels(key)} {_format_value(total)}")
+            lines.append(
+                f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.__metrics: List[Metric] = list()
+
+    def register(self, metric: Metric) -> Metric:
+        self.__metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self.register(Counter(name, help))
+
+    def gauge(self, name: str, help: str, function: Callable[[], float] = None) -> Gauge:
+        return self.register(Gauge(name, help, function))
+
+    def histogram(self, name: str, help: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, buckets))
+
+    def render(self) -> str:
+        # Prometheus text exposition format
+        return "\n".join(metric.render() for metric in self.__metrics) + "\n"
+
+
+class ServerMetrics(Registry):
+    def __init__(self):
+        super().__init__()
+        self.connections = self.counter(
+            "battleship_connections_total", "Accepted connections")
+        self.games_started = self.counter(
+            "battleship_games_started_total", "Games started")
+        self.games_finished = self.counter(
+            "battleship_games_finished_total", "Games finished")
+        self.messages = self.counter(
+            "battleship_messages_total", "Messages received from players by type")
+        self.message_handling = self.histogram(
+            "battleship_message_handling_seconds", "Time spent handling a received message by type")
+        self.turn_round_trip = self.histogram(
+            "battleship_turn_round_trip_seconds", "From an attack reaching the server to its outcome leaving for the attacker")
+        self.lobby_wait = self.histogram(
+            "battleship_lobby_wait_seconds", "Time between connecting and being paired")
+        self.active_threads = self.gauge(
+            "battleship_active_threads", "Live threads in the server process", threading.active_count)
+        self.active_games = self.gauge(
+            "battleship_active_games", "Games in progress")
+        self.lobby_size = self.gauge(
+            "battleship_lobby_size", "Players waiting for an opponent")
+
+
+class MetricsServer:
+    # serves GET /metrics from a daemon thread
+    def __init__(self, registry: Registry, address: Tuple[str, int]):
+        self.__registry = registry
+        self.__address = address
+        self.__httpd: Optional[ThreadingHTTPServer] = None
+        self.logger = logging.getLogger("MetricsServer")
+
+    def getAddress(self):
+        return self.__httpd.server_address if self.__httpd is not None else self.__address
+
+    def start(self):
+        registry = self.__registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.__httpd = ThreadingHTTPServer(self.__address, Handler)
+        self.__httpd.daemon_threads = True
+        threading.Thread(target=self.__httpd.serve_forever,
+                         daemon=True).start()
+        self.logger.info(
+            f"Metrics on http://{self.getAddress()[0]}:{self.getAddress()[1]}/metrics")
+
+    def stop(self):
+        if self.__httpd is not None:
+            self.__httpd.shutdown()
+            self.__httpd.server_close()
@@ -0,0 +1,106 @@
+import logging
+import selectors
+import socket
+import threading
+from collections import deque
+from itertools import islice
+from typing import Callable
+from selector_loop import SelectorLoop
+
+logging.basicConfig(level=logging.INFO,
+                    format='%(name)s: %(message)s',
+                    )
+
+# bytes a client may leave unread before it is dropped
+DEFAULT_HIGH_WATER_MARK = 256 * 1024
+# frames handed to a single sendmsg call
+MAX_BUFFERS = 64
+
+
+class SlowConsumerError(OSError):
+    pass
+
+
+class OutboundQueue:
+    def __init__(self, sock: socket.socket, high_water_mark: int = DEFAULT_HIGH_WATER_MARK):
+        self.__socket = sock
+        self.__frames: deque[memoryview] = deque()
+        self.__pending_size = 0
+        self.__high_water_mark = high_water_mark
+        self.__lock = threading.Lock()
+
+    def getSocket(self) -> socket.socket:
+        return self.__socket
+
+    def getPendingSize(self):
+        return self.__pending_size
+
+    def getHighWaterMark(self):
+        return self.__high_water_mark
+
+    def push(self, frame: bytes) -> bool:
+        # queue the frame and write as much as the socket takes right now,
+        # True when bytes are left for the flusher
+        with self.__lock:
+            self.__frames.append(memoryview(frame))
+            self.__pending_size += len(frame)
+            pending = self.__flush()
+            if self.__pending_size > self.__high_water_mark:
+                raise SlowConsumerError(
+                    f"{self.__pending_size} bytes still unread, high-water mark is {self.__high_water_mark}")
+            return pending
+
+    def flush(self) -> bool:
+        with self.__lock:
+            return self.__flush()
+
+    def __flush(self) -> bool:
+        frames = self.__frames
+        while frames:
+            # queued frames leave in one writev-style call, never blocking the caller
+            try:
+                sent = self.__socket.sendmsg(
+                    list(islice(frames, MAX_BUFFERS)), [], socket.MSG_DONTWAIT)
+            except (BlockingIOError, InterruptedError):
+                break
+            self.__pending_size -= sent
+            while sent:
+                if len(frames[0]) <= sent:
+                    sent -= len(frames.popleft())
+                else:
+                    frames[0] = frames[0][sent:]
+                    sent = 0
+        return bool(frames)
+
+
+class OutboundFlusher(SelectorLoop):
+    # drains every queue the socket did not take at once, from a single thread
+    def __init__(self):
+        super().__init__("OutboundFlusher")
+
+    def watch(self, queue: OutboundQueue, on_error: Callable[[OSError], None]):
+        self._submit((queue, on_error))
+
+    def _on_submitted(self, item):
+        queue, on_error = item
+        sock = queue.getSocket()
+        if sock.fileno() == -1:
+            return
+        key = self._selector.get_map().get(sock.fileno())
+        if key is not None and key.fileobj is sock:
+            return
+        if key is not None:
+            # the descriptor was closed and reused by a new connection
+            self._selector.unregister(key.fileobj)
+        self._selector.register(sock, selectors.EVENT_WRITE, (queue, on_error))
+
+    def _on_ready(self, key: selectors.SelectorKey):
+        queue, on_error = key.data
+        try:
+            if queue.flush():
+                return
+            self._selector.unregister(key.fileobj)
+        except OSError as e:
+            self._selector.unregister(key.fileobj)
+            self.logger.warning(f"Error flushing client: {e}")
+            on_error(e)
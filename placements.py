@@ -0,0 +1,57 @@
+from functools import lru_cache
+from typing import Tuple
+
+# (board, ship shape, orientation) keys kept, plenty for the board sizes a server hosts at once;
+# every bot enumerates its opponent's placements from them when its game starts
+PLACEMENT_CACHE_SIZE = 1024
+# boards above this many cells are computed on every call: their entries grow with the area
+# and the cache would keep them alive
+PLACEMENT_CACHE_AREA = 4096
+
+
+def ship_span(ship_height: int, ship_width: int, orientation: str) -> Tuple[int, int]:
+    # a ship spans height columns and width rows, swapped when vertical
+    if orientation == 'v':
+        return ship_width, ship_height
+    return ship_height, ship_width
+
+
+def rectangle_mask(x: int, y: int, columns: int, rows: int, width: int) -> int:
+    # cell (x, y) is bit y * width + x, as in bitboard.BitboardField
+    row = ((1 << columns) - 1) << x
+    mask = 0
+    for dy in range(rows):
+        mask |= row << ((y + dy) * width)
+    return mask
+
+
+def anchor_ranges(height: int, width: int, columns: int, rows: int) -> Tuple[range, range]:
+    # 0-based x and y of every anchor Field.place_ship accepts for a columns x rows ship
+    return (range(min(width - 2, width - columns) + 1),
+            range(min(height - 2, height - rows) + 1))
+
+
+def _placement_cells(height: int, width: int, ship_height: int, ship_width: int, orientation: str) -> Tuple[Tuple[int, ...], ...]:
+    columns, rows = ship_span(ship_height, ship_width, orientation)
+    xs, ys = anchor_ranges(height, width, columns, rows)
+    offsets = tuple(dy * width + dx for dy in range(rows) for dx in range(columns))
+    return tuple(
+        tuple(y * width + x + offset for offset in offsets)
+        for y in ys for x in xs
+    )
+
+
+_cached_placement_cells = lru_cache(maxsize=PLACEMENT_CACHE_SIZE)(_placement_cells)
+
+
+def placement_cells(height: int, width: int, ship_height: int, ship_width: int, orientation: str) -> Tuple[Tuple[int, ...], ...]:
+    # every anchor Field.place_ship accepts for the ship on an empty board,
+    # as the flat cell indexes y * width + x the ship covers
+    if height * width > PLACEMENT_CACHE_AREA:
+        return _placement_cells(height, width, ship_height, ship_width, orientation)
+    return _cached_placement_cells(height, width, ship_height, ship_width, orientation)
+
+
+def orientations(ship_height: int, ship_width: int) -> Tuple[str, ...]:
+    # a square ship looks the same both ways
+    return ('h',) if ship_height == ship_width else ('h', 'v')
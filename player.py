@@ -1,17 +1,24 @@
-import json
 import logging
+import random
+import re
 import select
+import shutil
 import socket
 import sys
 import threading
 import time
-from typing import List, override
+from array import array
+from typing import List, Optional, override
+from codec import CODEC_JSON, SUPPORTED_CODECS, DecodeError, negotiate
+from framing import FrameTooLargeError, MessageReader, pack_message
+from placements import orientations, ship_span
 
 logging.basicConfig(level=logging.INFO,
                     format='%(name)s: %(message)s',
                     )
 
 DEFAULT_SIGN = '.'
+ANSI_COLOR = re.compile(r"\033\[[0-9;]*m")
 
 
 class CoordinateTakenException(Exception):
@@ -27,6 +34,8 @@ class InconsistentCoordinatesException(Exception):
 
 
 class Coordinate:
+    __slots__ = ("__x", "__y", "__damaged")
+
     def __init__(self, x: int, y: int):
         self.__x: int = x
         self.__y: int = y
@@ -46,6 +55,8 @@ class Coordinate:
 
 
 class Ship:
+    __slots__ = ("__name", "__height", "__width", "__sign")
+
     def __init__(self, name: str, sign: str, height: int, width: int):
         if len(sign) == 1 and sign != DEFAULT_SIGN:
             self.__name = name
@@ -74,14 +85,169 @@ class Ship:
         return self.__sign
 
 
+class HitResult:
+    MISS = "miss"
+    HIT = "hit"
+    SUNK = "sunk"
+
+    __slots__ = ("__status", "__ship_names")
+
+    def __init__(self, status: str, ship_names: List[str] = None):
+        self.__status: str = status
+        self.__ship_names: List[str] = ship_names or []
+
+    def getStatus(self):
+        return self.__status
+
+    def getShipNames(self):
+        return self.__ship_names
+
+    def getShipName(self):
+        return self.__ship_names[0] if self.__ship_names else None
+
+    def is_hit(self):
+        return self.__status != HitResult.MISS
+
+    def __bool__(self):
+        return self.is_hit()
+
+
+class GameConfig:
+    # board size and fleet of a game, sent to both players with start_game
+    __slots__ = ("__height", "__width", "__fleet", "__win_threshold")
+
+    def __init__(self, height: int, width: int, fleet: List[Ship], win_threshold: int = None):
+        self.__height: int = height
+        self.__width: int = width
+        self.__fleet: List[tuple[str, str, int, int]] = [
+            (ship.getName(), ship.getSign(), ship.getHeight(), ship.getWidth())
+            for ship in fleet
+        ]
+        # damaged cells that end the game, the whole fleet unless told otherwise
+        self.__win_threshold: int = win_threshold if win_threshold is not None else self.getFleetCells()
+
+    def getHeight(self):
+        return self.__height
+
+    def getWidth(self):
+        return self.__width
+
+    def getWinThreshold(self):
+        return self.__win_threshold
+
+    def getFleet(self) -> List[Ship]:
+        # new ships every call, landing a ship vertically swaps its dimensions
+        return [Ship(*ship) for ship in self.__fleet]
+
+    def getFleetCells(self) -> int:
+        return sum(height * width for _, _, height, width in self.__fleet)
+
+    def new_field(self, field_backend=None):
+        return (field_backend or Field)(self.__height, self.__width)
+
+    def to_message(self) -> dict:
+        return {
+            "height": self.__height,
+            "width": self.__width,
+            "fleet": [
+                {"name": name, "sign": sign, "height": height, "width": width}
+                for name, sign, height, width in self.__fleet
+            ],
+            "win_threshold": self.__win_threshold
+        }
+
+    @staticmethod
+    def from_message(message: dict):
+        return GameConfig(
+            message["height"],
+            message["width"],
+            [
+                Ship(ship["name"], ship["sign"], ship["height"], ship["width"])
+                for ship in message["fleet"]
+            ],
+            message["win_threshold"]
+        )
+
+
+# the hit cell and its four diagonal neighbours
+SPLASH_OFFSETS = ((0, 0), (-1, 1), (-1, -1), (1, -1), (1, 1))
+# boards above this many cells only store the cells ships cover
+SPARSE_AREA = 4096
+# random passes Field.auto_place makes over a dense board before it gives up
+AUTO_PLACE_ATTEMPTS = 50
+
+
+class SparseCells(dict):
+    # cell index -> ship index + 1, water is never stored
+    __slots__ = ()
+
+    def __missing__(self, index: int) -> int:
+        return 0
+
+
+class FreeAnchors:
+    # 0-based anchors where a columns x rows ship still fits, drawn and removed in O(1)
+    __slots__ = ("__columns", "__rows", "__span", "__max_y", "__anchors", "__positions")
+
+    def __init__(self, height: int, width: int, columns: int, rows: int):
+        self.__columns: int = columns
+        self.__rows: int = rows
+        # Field.place_ship takes 1-based anchors below the width and height
+        max_x = min(width - 2, width - columns)
+        self.__max_y: int = min(height - 2, height - rows)
+        self.__span: int = max_x + 1 if max_x >= 0 and self.__max_y >= 0 else 0
+        count = self.__span * (self.__max_y + 1)
+        # anchor y * span + x; a removed anchor swaps places with the last one
+        self.__anchors: List[int] = list(range(count))
+        self.__positions: List[int] = list(range(count))
+
+    def __len__(self):
+        return len(self.__anchors)
+
+    def get(self, position: int) -> tuple[int, int]:
+        y, x = divmod(self.__anchors[position], self.__span)
+        return x, y
+
+    def __remove(self, anchor: int):
+        position = self.__positions[anchor]
+        if position < 0:
+            return
+        last = self.__anchors.pop()
+        if last != anchor:
+            self.__anchors[position] = last
+            self.__positions[last] = position
+        self.__positions[anchor] = -1
+
+    def remove_overlapping(self, x: int, y: int, columns: int, rows: int):
+        # drops every anchor whose ship would share a cell with the given rectangle
+        first_x = max(0, x - self.__columns + 1)
+        last_x = min(self.__span - 1, x + columns - 1)
+        for anchor_y in range(max(0, y - self.__rows + 1), min(self.__max_y, y + rows - 1) + 1):
+            row = anchor_y * self.__span
+            for anchor_x in range(first_x, last_x + 1):
+                self.__remove(row + anchor_x)
+
+
 class Field:
-    def __init__(self, height: int, width: int):
+    __slots__ = ("__height", "__width", "__ships", "__ship_origins",
+                 "__ship_damage", "__ship_cells", "__damaged_cells", "__cells")
+
+    def __init__(self, height: int, width: int, sparse: bool = None):
         self.__height: int = height
         self.__width: int = width
         self.__ships: List[dict[Ship, List[Coordinate]]] = []
-        self.__grid: List[List[(Coordinate, str)]] = [
-            [(Coordinate(x, y), DEFAULT_SIGN) for x in range(self.__width)] for y in range(self.__height)
-        ]
+        # (x, y, rows) of each ship's first cell, locates a cell inside "coordinates"
+        self.__ship_origins: List[tuple[int, int, int]] = []
+        self.__ship_damage: List[int] = []
+        # running totals kept up to date as ships land and get hit
+        self.__ship_cells: int = 0
+        self.__damaged_cells: int = 0
+        # 0 for water, otherwise index in self.__ships + 1: a flat array on small boards,
+        # only the occupied cells on large ones so setup and memory grow with the fleet
+        if sparse is None:
+            sparse = height * width > SPARSE_AREA
+        self.__cells: array | SparseCells = SparseCells() if sparse else array(
+            'H', [0]) * (height * width)
 
     def getShips(self):
         return self.__ships
@@ -92,7 +258,27 @@ class Field:
     def getWidth(self):
         return self.__width
 
-    def place_ship(self, ship: Ship, place_coordinates: tuple((int, int)), orientation: ['v', 'h']):
+    def is_sparse(self):
+        return isinstance(self.__cells, SparseCells)
+
+    def __ship_at(self, x: int, y: int) -> int:
+        # index in self.__ships of the ship covering (x, y), -1 for water or off the board
+        if 0 <= x < self.__width and 0 <= y < self.__height:
+            return self.__cells[y * self.__width + x] - 1
+        return -1
+
+    def __coordinate_at(self, ship_index: int, x: int, y: int) -> Coordinate:
+        origin_x, origin_y, rows = self.__ship_origins[ship_index]
+        return self.__ships[ship_index]["coordinates"][(x - origin_x) * rows + y - origin_y]
+
+    def getCell(self, x: int, y: int) -> tuple[str, bool]:
+        # 0-based cell lookup: (sign, damaged)
+        ship_index = self.__ship_at(x, y)
+        if ship_index < 0:
+            return DEFAULT_SIGN, False
+        return self.__ships[ship_index]["ship"].getSign(), self.__coordinate_at(ship_index, x, y).is_damaged()
+
+    def __validate_placement(self, ship: Ship, place_coordinates: tuple((int, int)), orientation: ['v', 'h'], reserved: set) -> List[tuple[int, int]]:
         # Validate coordinates
         if not (1 <= place_coordinates[0] < self.__width) or not (1 <= place_coordinates[1] < self.__height):
             raise InconsistentCoordinatesException(
@@ -101,150 +287,293 @@ class Field:
             place_coordinates[0]-1, place_coordinates[1]-1
         )
 
-        ship_coordinates = []
+        # a ship spans getHeight() columns and getWidth() rows once oriented
+        columns, rows = ship.getHeight(), ship.getWidth()
+        if orientation == 'v':
+            columns, rows = rows, columns
+
+        if not (place_coordinates[0] + columns <= self.__width and place_coordinates[1] + rows <= self.__height):
+           # Ship overflows the grid
+            raise InconsistentCoordinatesException(
+                f"Ship placement out of range: ({place_coordinates[0]}..{place_coordinates[0] + columns}, {place_coordinates[1]}..{place_coordinates[1] + rows})")
+
+        # the grid doubles as the occupancy index: O(ship cells) whatever the fleet size
+        cells = []
+        for y in range(columns):
+            for x in range(rows):
+                cell = (y + place_coordinates[0], x + place_coordinates[1])
+                if self.__cells[cell[1] * self.__width + cell[0]] or cell in reserved:
+                    raise CoordinateTakenException(
+                        f"Coordinate ({cell[0]+1}, {cell[1]+1}) is already taken")
+                cells.append(cell)
+        return cells
+
+    def __land_ship(self, ship: Ship, orientation: ['v', 'h'], cells: List[tuple[int, int]]):
         if orientation == 'v':
             ship_height = ship.getHeight()
             ship_width = ship.getWidth()
             ship.setHeight(ship_width)
             ship.setWidth(ship_height)
 
-        reserved_coordinates: List[Coordinate] = [
-            coordinate
-            for ship
-            in self.__ships
-            for coordinate
-            in ship["coordinates"]
-
-        ]
-        counter = 0
-        if place_coordinates[1] + ship.getWidth() <= self.__width and place_coordinates[0] + ship.getHeight() <= self.__height:
-            for y in range(ship.getHeight()):
-                for x in range(ship.getWidth()):
-                    for reserved_coordinate in reserved_coordinates:
-                        if y + place_coordinates[0] == reserved_coordinate.getX() and x + place_coordinates[1] == reserved_coordinate.getY():
-                            raise CoordinateTakenException(
-                                f"Coordinate ({y + place_coordinates[0]+1}, {x + place_coordinates[1]+1}) is already taken")
-
-                    new_coordinate = Coordinate(
-                        y + place_coordinates[0], x + place_coordinates[1]
-                    )
-                    counter += 1
-                    self.__grid[x + place_coordinates[1]][y + place_coordinates[0]] = (
-                        new_coordinate, ship.getSign()
-                    )
-                    ship_coordinates.append(new_coordinate)
-        else:
-           # Ship overflows the grid
-            raise InconsistentCoordinatesException(
-                f"Ship placement out of range: ({place_coordinates[0]}..{place_coordinates[0] + ship.getHeight()}, {place_coordinates[1]}..{place_coordinates[1] + ship.getWidth()})")
+        ship_coordinates = []
+        for x, y in cells:
+            ship_coordinates.append(Coordinate(x, y))
+            self.__cells[y * self.__width + x] = len(self.__ships) + 1
         # ship is clear to land
+        self.__ship_origins.append(
+            (cells[0][0], cells[0][1], ship.getWidth())
+        )
+        self.__ship_damage.append(0)
+        self.__ship_cells += len(ship_coordinates)
         self.__ships.append({
             "ship": ship,
             "coordinates": ship_coordinates
         })
 
-    def hit_ship(self, hit_x: int, hit_y: int) -> bool:
-        hit_counter = 0
+    def place_ship(self, ship: Ship, place_coordinates: tuple((int, int)), orientation: ['v', 'h']):
+        cells = self.__validate_placement(
+            ship, place_coordinates, orientation, set()
+        )
+        self.__land_ship(ship, orientation, cells)
+
+    def auto_place(self, fleet: List[Ship], rng: random.Random = None) -> List[tuple[Ship, tuple[int, int], str]]:
+        # lands copies of the fleet at random and returns their placements, each ship is drawn
+        # uniformly among the anchors still free for its shape; a dense board can run out of
+        # anchors before the last ship, the whole fleet is drawn again a bounded number of times
+        rng = rng or random.Random()
+        ships = [
+            Ship(ship.getName(), ship.getSign(), ship.getHeight(), ship.getWidth())
+            for ship in fleet
+        ]
+        # the largest ships go first while the board is still open
+        order = sorted(
+            range(len(ships)),
+            key=lambda index: -ships[index].getHeight() * ships[index].getWidth()
+        )
+        # the last turn each shape is needed, later ships no longer update its index
+        last_use = dict()
+        for turn, index in enumerate(order):
+            ship = ships[index]
+            for orientation in orientations(ship.getHeight(), ship.getWidth()):
+                last_use[ship_span(ship.getHeight(), ship.getWidth(), orientation)] = turn
+        # (x, y, columns, rows) of the ships already on the field
+        landed = [
+            (x, y, ship["ship"].getHeight(), rows)
+            for ship, (x, y, rows) in zip(self.__ships, self.__ship_origins)
+        ]
+        for _ in range(AUTO_PLACE_ATTEMPTS):
+            placements = self.__draw_fleet(ships, order, last_use, landed, rng)
+            if placements is not None:
+                self.place_ships(placements)
+                return placements
+        raise CoordinateTakenException(
+            f"No room left for the fleet after {AUTO_PLACE_ATTEMPTS} attempts")
+
+    def __draw_fleet(self, ships: List[Ship], order: List[int], last_use: dict, landed: list, rng: random.Random) -> Optional[List[tuple[Ship, tuple[int, int], str]]]:
+        # one greedy pass, None once a ship finds no free anchor
+        taken = list(landed)
+        indexes: dict[tuple[int, int], FreeAnchors] = dict()
+        placements = [None] * len(ships)
+        for turn, index in enumerate(order):
+            ship = ships[index]
+            shapes = []
+            for orientation in orientations(ship.getHeight(), ship.getWidth()):
+                shape = ship_span(ship.getHeight(), ship.getWidth(), orientation)
+                if shape not in indexes:
+                    indexes[shape] = FreeAnchors(self.__height, self.__width, *shape)
+                    for rectangle in taken:
+                        indexes[shape].remove_overlapping(*rectangle)
+                shapes.append((orientation, shape, indexes[shape]))
+            draw = rng.randrange(sum(len(anchors) for _, _, anchors in shapes) or 1)
+            for orientation, shape, anchors in shapes:
+                if draw < len(anchors):
+                    x, y = anchors.get(draw)
+                    break
+                draw -= len(anchors)
+            else:
+                return None
+            taken.append((x, y, *shape))
+            for other_shape, anchors in indexes.items():
+                if last_use[other_shape] > turn:
+                    anchors.remove_overlapping(x, y, *shape)
+            placements[index] = (ship, (x + 1, y + 1), orientation)
+        return placements
+
+    def to_snapshot(self) -> List[list]:
+        # [name, sign, columns, rows, x, y, damage] per landed ship, 0-based origin,
+        # bit dx * rows + dy of damage set for each damaged cell
+        snapshot = []
+        for index, ship in enumerate(self.__ships):
+            x, y, rows = self.__ship_origins[index]
+            damage = 0
+            if self.__ship_damage[index]:
+                for bit, coordinate in enumerate(ship["coordinates"]):
+                    if coordinate.is_damaged():
+                        damage |= 1 << bit
+            snapshot.append([
+                ship["ship"].getName(), ship["ship"].getSign(),
+                ship["ship"].getHeight(), rows, x, y, damage
+            ])
+        return snapshot
+
+    def restore(self, snapshot: List[list]):
+        # lands the ships of a to_snapshot() as they were and replays their damage
+        first = len(self.__ships)
+        self.place_ships([
+            (Ship(name, sign, columns, rows), (x + 1, y + 1), 'h')
+            for name, sign, columns, rows, x, y, _ in snapshot
+        ])
+        for index, ship in enumerate(snapshot, start=first):
+            damage = ship[-1]
+            for bit, coordinate in enumerate(self.__ships[index]["coordinates"]):
+                if damage >> bit & 1:
+                    coordinate.setDamaged()
+                    self.__ship_damage[index] += 1
+                    self.__damaged_cells += 1
+
+    def place_ships(self, placements: List[tuple[Ship, tuple[int, int], str]]):
+        # the whole fleet is validated before anything lands, a failure leaves the field untouched
+        reserved = set()
+        fleet = []
+        for ship, place_coordinates, orientation in placements:
+            cells = self.__validate_placement(
+                ship, place_coordinates, orientation, reserved
+            )
+            reserved.update(cells)
+            fleet.append((ship, orientation, cells))
+        for ship, orientation, cells in fleet:
+            self.__land_ship(ship, orientation, cells)
+
+    def fire(self, hit_x: int, hit_y: int) -> HitResult:
         hit_x -= 1
         hit_y -= 1
-        for ship in self.__ships:
-            for index, coordinate in enumerate(ship["coordinates"]):
-                x, y = coordinate.getX(), coordinate.getY()
-                if (x, y) in [(hit_x - 1, hit_y + 1), (hit_x - 1, hit_y - 1), (hit_x + 1, hit_y - 1), (hit_x + 1, hit_y + 1), (hit_x, hit_y)]:
-                    coordinate.setDamaged()
-                    hit_counter += 1
+        hit_ships = []
+        damaged_ships = []
+        for dx, dy in SPLASH_OFFSETS:
+            ship_index = self.__ship_at(hit_x + dx, hit_y + dy)
+            if ship_index < 0:
+                continue
+            coordinate = self.__coordinate_at(
+                ship_index, hit_x + dx, hit_y + dy
+            )
+            if not coordinate.is_damaged():
+                coordinate.setDamaged()
+                self.__ship_damage[ship_index] += 1
+                self.__damaged_cells += 1
+                damaged_ships.append(ship_index)
+            if ship_index not in hit_ships:
+                hit_ships.append(ship_index)
+
+        if not hit_ships:
+            return HitResult(HitResult.MISS)
+        # a ship is only reported sunk by the shot that damaged its last cell
+        sunk = [
+            ship_index for ship_index in hit_ships
+            if ship_index in damaged_ships and self.__ship_damage[ship_index] == len(self.__ships[ship_index]["coordinates"])
+        ]
+        return HitResult(
+            HitResult.SUNK if sunk else HitResult.HIT,
+            [self.__ships[ship_index]["ship"].getName()
+             for ship_index in (sunk or hit_ships)]
+        )
 
-        return hit_counter > 0
+    def hit_ship(self, hit_x: int, hit_y: int) -> bool:
+        return self.fire(hit_x, hit_y).is_hit()
 
     @staticmethod
-    def display_fields(player_field, opponent_field, show_opponent: bool = False):
-        lines_counter = 0
+    def build_frame(player_field, opponent_field, show_opponent: bool = False, cells: list = None) -> str:
+        # `cells` collects (line, column, text) of every board cell for FieldRenderer
         blue = "\033[94m"
         pink = "\033[95m"
         gray = "\033[90m"
         red = "\033[91m"
         green = "\033[92m"
         end_color = "\033[0m"
-
-        print("\n\n----------------------------------------------------------------------------------------------------------------------------------------------------------\n\n")
-        lines_counter += 1
-
-        # Print player's x-axis coordinates
-        print("\t    " + '    '.join(str(f"{pink}{i+1}{end_color}")
-              for i in range(player_field.__width)), end="\t\t")
-
-        # Print opponent's x-axis coordinates
-        print("\t    " + '    '.join(str(f"{pink}{i+1}{end_color}")
-              for i in range(opponent_field.__width)))
-
-        lines_counter += 1
-
-        # Print player's top border
-        print(
-            "\t  " + "".join(["-----" for _ in range(player_field.__width)]), end="\t\t")
-
-        # Print opponent's top border
-        print(
-            "\t  " + "".join(["-----" for _ in range(opponent_field.__width)]))
-
-        lines_counter += 1
-
-        for y, (player_row, opponent_row) in enumerate(zip(player_field.__grid, opponent_field.__grid)):
-            # Print player's y-axis coordinate with color
-            print(f"{blue}{y+1}{end_color}\t |", end="")
-
-            # Print player's grid
-            for cell in player_row:
-                sign = cell[1]
+        separator = "\n\n" + "-" * 154 + "\n\n\n"
+        player_width = player_field.getWidth()
+        opponent_width = opponent_field.getWidth()
+        frame = [separator]
+
+        # x-axis coordinates of both fields
+        frame.append("\t    " + '    '.join(f"{pink}{i+1}{end_color}"
+                     for i in range(player_width)) + "\t\t")
+        frame.append("\t    " + '    '.join(f"{pink}{i+1}{end_color}"
+                     for i in range(opponent_width)) + "\n")
+
+        # top borders
+        frame.append("\t  " + "-----" * player_width + "\t\t")
+        frame.append("\t  " + "-----" * opponent_width + "\n")
+
+        line = separator.count("\n") + 2
+        for y in range(min(player_field.getHeight(), opponent_field.getHeight())):
+            # player's y-axis coordinate and grid
+            row = [f"{blue}{y+1}{end_color}\t |"]
+            column = len(f"{y+1}\t |".expandtabs())
+            for x in range(player_width):
+                sign, damaged = player_field.getCell(x, y)
                 if sign == DEFAULT_SIGN:
-                    print(f"  {gray}{sign}{end_color}  ", end="")
+                    cell = f"{gray}{sign}{end_color}"
+                elif damaged:
+                    cell = f"{red}{sign}{end_color}"
                 else:
-                    if cell[0].is_damaged():
-                        print(f"  {red}{sign}{end_color}  ", end="")
-                    else:
-                        print(f"  {green}{sign}{end_color}  ", end="")
-
-            print("|", end="\t\t")
-
-            # Print opponent's y-axis coordinate with color
-            print(f"|{blue}{y+1}{end_color}\t |", end="")
-
-            # Print opponent's grid
-            for cell in opponent_row:
-                sign = cell[1]
+                    cell = f"{green}{sign}{end_color}"
+                row.append(f"  {cell}  ")
+                if cells is not None:
+                    cells.append((line, column + 5 * x + 2, cell))
+
+            # opponent's y-axis coordinate and grid
+            row.append(f"|\t\t|{blue}{y+1}{end_color}\t |")
+            column = len(
+                (f"{y+1}\t |" + " " * 5 * player_width + f"|\t\t|{y+1}\t |").expandtabs())
+            for x in range(opponent_width):
+                sign, damaged = opponent_field.getCell(x, y)
                 if not show_opponent:
-                    if cell[0].is_damaged():
-                        print(f"  {red}{"¤"}{end_color}  ", end="")
+                    if damaged:
+                        cell = f"{red}¤{end_color}"
                     else:
-                        print(f"  {gray}{DEFAULT_SIGN}{end_color}  ", end="")
+                        cell = f"{gray}{DEFAULT_SIGN}{end_color}"
+                elif sign == DEFAULT_SIGN:
+                    cell = f"{gray}{sign}{end_color}"
+                elif damaged:
+                    cell = f"{red}{sign}{end_color}"
                 else:
-                    if sign == DEFAULT_SIGN:
-                        print(f"  {gray}{sign}{end_color}  ", end="")
-                    else:
-                        if cell[0].is_damaged():
-                            print(f"  {red}{sign}{end_color}  ", end="")
-                        else:
-                            print(f"  {green}{sign}{end_color}  ", end="")
+                    cell = f"{green}{sign}{end_color}"
+                row.append(f"  {cell}  ")
+                if cells is not None:
+                    cells.append((line, column + 5 * x + 2, cell))
 
-            print("|\n")
+            row.append("|\n\n")
+            frame.append("".join(row))
+            line += 2
 
-        # Print the bottom borders for player and opponent
-        print(
-            "\t  " + "".join(["-----" for _ in range(player_field.__width)]), end="\t\t")
-        print(
-            "\t  " + "".join(["-----" for _ in range(opponent_field.__width)]), end="\n")
+        # bottom borders
+        frame.append("\t  " + "-----" * player_width + "\t\t")
+        frame.append("\t  " + "-----" * opponent_width + "\n")
 
-        print("\t\t\t\tYou", end="\t\t\t\t")
-        print("\t\t\t\t\tOpponent")
-        print("\n\n----------------------------------------------------------------------------------------------------------------------------------------------------------\n\n")
+        frame.append("\t\t\t\tYou\t\t\t\t")
+        frame.append("\t\t\t\t\tOpponent\n")
+        frame.append(separator)
+        return "".join(frame)
+
+    @staticmethod
+    def display_fields(player_field, opponent_field, show_opponent: bool = False):
+        # one write per frame instead of one print per cell
+        sys.stdout.write(
+            Field.build_frame(player_field, opponent_field, show_opponent)
+        )
+        sys.stdout.flush()
 
     def count_damaged_coordinates(self) -> int:
-        counter = 0
-        for ship in self.__ships:
-            for coordinate in ship["coordinates"]:
-                if coordinate.is_damaged():
-                    counter += 1
-        return counter
+        return self.__damaged_cells
+
+    def remaining_cells(self) -> int:
+        return self.__ship_cells - self.__damaged_cells
+
+    def is_defeated(self, max_damaged_coordinates: int = None) -> bool:
+        # without a threshold the whole fleet has to be destroyed
+        if max_damaged_coordinates is None:
+            return self.__ship_cells > 0 and self.remaining_cells() == 0
+        return self.__damaged_cells >= max_damaged_coordinates
 
     def detect_ship_orientation(self, ship: Ship):
         x_axis = []
@@ -261,6 +590,78 @@ class Field:
             return 'v'
 
 
+class FieldRenderer:
+    def __init__(self, stream=None, diff: bool = None, terminal_size: tuple[int, int] = None):
+        self.__stream = stream or sys.stdout
+        # cursor addressing only makes sense on a terminal
+        self.__diff: bool = self.__stream.isatty() if diff is None else diff
+        self.__terminal_size = terminal_size
+        self.__previous_cells: list = None
+        self.__bytes_written: int = 0
+
+    def getBytesWritten(self):
+        return self.__bytes_written
+
+    def reset(self):
+        # forget the last frame, the next render is a full redraw
+        self.__previous_cells = None
+
+    def __fits(self, frame: str) -> bool:
+        columns, rows = self.__terminal_size or shutil.get_terminal_size()
+        lines = frame.split("\n")
+        return len(lines) < rows and all(
+            len(ANSI_COLOR.sub("", line).expandtabs()) <= columns for line in lines
+        )
+
+    def __write(self, output: str) -> int:
+        self.__stream.write(output)
+        self.__stream.flush()
+        written = len(output.encode())
+        self.__bytes_written += written
+        return written
+
+    def render(self, player_field, opponent_field, show_opponent: bool = False) -> int:
+        # returns the number of bytes written for this frame
+        cells = []
+        frame = Field.build_frame(
+            player_field, opponent_field, show_opponent, cells
+        )
+        previous_cells = self.__previous_cells
+        if not self.__diff:
+            return self.__write(frame)
+
+        if previous_cells is not None and len(previous_cells) == len(cells):
+            self.__previous_cells = cells
+            changed = [
+                f"\033[{line + 1};{column + 1}H{text}"
+                for (line, column, text), previous in zip(cells, previous_cells)
+                if previous != (line, column, text)
+            ]
+            if not changed:
+                return 0
+            # save the cursor, patch the cells, restore the cursor
+            return self.__write("\0337" + "".join(changed) + "\0338")
+
+        if not self.__fits(frame):
+            self.__previous_cells = None
+            return self.__write(frame)
+
+        # pin the frame at the top of the screen and let logs and prompts scroll below it
+        self.__previous_cells = cells
+        frame_lines = frame.count("\n")
+        rows = (self.__terminal_size or shutil.get_terminal_size())[1]
+        return self.__write(
+            "\033[H\033[2J" + frame +
+            f"\033[{frame_lines + 1};{rows}r\033[{frame_lines + 1};1H"
+        )
+
+    def close(self):
+        # give the whole screen back to the terminal
+        if self.__previous_cells is not None:
+            self.__write("\033[r")
+            self.__previous_cells = None
+
+
 class Player:
     def __init__(self, field: Field):
         self.__field = field
@@ -315,14 +716,27 @@ class Player:
 
 
 class Client:
-    def __init__(self, host, port, close_event, player: Player, opponent: Player):
+    def __init__(self, host, port, close_event, player: Player, opponent: Player, codecs: List[str] = SUPPORTED_CODECS, quick_play: bool = False, session: str = None):
         self.host = host
         self.port = port
+        # the fleet is placed at random instead of prompting for every ship
+        self.quick_play = quick_play
+        # token of our game, sent back to a restarted server to get the seat again
+        self.session = session
+        self.resuming = session is not None
+        # start_game heard while the server still decides on our resume, played only if it is rejected
+        self.resume_sent = False
+        self.deferred_start: Optional[dict] = None
+        # codecs we are willing to speak, the server picks one after wait_for_opponent
+        self.codecs = codecs
+        self.codec = CODEC_JSON
         self.__player = player
         self.__opponent = opponent
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.reader = MessageReader(self.server_socket)
         self.close_event = close_event
         self.send_signal = threading.Event()
+        self.renderer = FieldRenderer()
         self.logger = logging.getLogger("Socket")
 
     def getPlayer(self):
@@ -350,88 +764,168 @@ class Client:
                     sockets_list, [], [])
                 for socks in read_sockets:
                     if socks == self.server_socket:
-                        message = socks.recv(4096)
-                        decoded_message = json.loads(message.decode())
-                        if (decoded_message["type"] == "close"):
+                        messages = self.reader.receive_available()
+                        if messages is None:
                             self._close_socket()
-                        elif decoded_message["type"] == "wait_for_opponent":
-                            self.logger.info(decoded_message["message"])
-                        elif decoded_message["type"] == "start_game":
-                            client.prompt_and_send_player_ship_informationss(
-                                default_ships
-                            )
-                        elif decoded_message["type"] == "coordinates":
-                            self.__handle_receiving_ships_coordinates(
-                                self.__opponent, decoded_message
-                            )
-                            if decoded_message["starting"] == 1:
-                                self.logger.info(
-                                    "The first hit is yours...")
-                                x, y = self.__player.prompt_hit_coordinate()
-                                self.server_socket.send(
-                                    json.dumps(
-                                        {
-                                            "type": "attack",
-                                            "coordinate": {
-                                                "x": x,
-                                                "y": y
-                                            }
-                                        }
-                                    ).encode()
-                                )
-                            else:
-                                self.logger.info(
-                                    "The first hit is for your opponent.., waiting for him to launch a missile")
-                        elif decoded_message["type"] == "attack":
-                            self.__handle_receive_attack(
-                                self.__player,
-                                (
-                                    decoded_message["coordinate"]["x"],
-                                    decoded_message["coordinate"]["y"]
-                                )
-                            )
-
-                        elif decoded_message["type"] == "attack_status":
-                            self.__handle_receive_attack_status(
-                                self.__opponent,
-                                (
-                                    decoded_message["coordinate"]["x"],
-                                    decoded_message["coordinate"]["y"]
-                                )
-                            )
-                        elif decoded_message["type"] == "launch_hit":
-                            self.__handle_lauch_hit()
-                        elif decoded_message["type"] == "end_game":
-                            self.__handle_end_game(decoded_message)
-                        else:
-                            self.logger.info(decoded_message)
+                            break
+                        for decoded_message in messages:
+                            self.__handle_message(decoded_message)
             except KeyboardInterrupt:
                 self._close_connection_from_client("exit")
                 break
-            except socket.error as e:
+            except (socket.error, FrameTooLargeError, DecodeError) as e:
                 self.logger.error(f"Error connecting to the server: {e}")
                 self._close_socket()
                 break
 
-    def __handle_receiving_ships_coordinates(self, client: Player, message):
-        for ship in message["ships"]:
-            client.getField().place_ship(
-                ship=Ship(
-                    ship["name"], ship["sign"], ship["height"], ship["width"]
-                ),
-                place_coordinates=(
-                    ship["x_start"]+1, ship["y_start"]+1
-                ),
-                orientation=ship["orientation"]
+    def __handle_message(self, decoded_message):
+        if (decoded_message["type"] == "close"):
+            self._close_socket()
+        elif decoded_message["type"] == "wait_for_opponent":
+            self.logger.info(decoded_message["message"])
+            if self.resuming:
+                self.__handle_resume_offer(decoded_message)
+            else:
+                self.__handle_codecs_offer(decoded_message)
+        elif decoded_message["type"] == "start_game":
+            if self.resume_sent:
+                self.deferred_start = decoded_message
+            else:
+                self.__handle_start_game(decoded_message)
+        elif decoded_message["type"] == "resume_game":
+            self.__handle_resume_game(decoded_message)
+        elif decoded_message["type"] == "resume_rejected":
+            self.__handle_resume_rejected(decoded_message)
+        elif decoded_message["type"] == "coordinates":
+            self.__handle_receiving_ships_coordinates(
+                self.__opponent, decoded_message
+            )
+            if decoded_message["starting"] == 1:
+                self.logger.info(
+                    "The first hit is yours...")
+                x, y = self.__player.prompt_hit_coordinate()
+                self.server_socket.sendall(
+                    pack_message(
+                        {
+                            "type": "attack",
+                            "coordinate": {
+                                "x": x,
+                                "y": y
+                            }
+                        },
+                        self.codec
+                    )
+                )
+            else:
+                self.logger.info(
+                    "The first hit is for your opponent.., waiting for him to launch a missile")
+        elif decoded_message["type"] == "attack":
+            self.__handle_receive_attack(
+                self.__player,
+                (
+                    decoded_message["coordinate"]["x"],
+                    decoded_message["coordinate"]["y"]
+                )
+            )
+
+        elif decoded_message["type"] == "attack_status":
+            self.__handle_receive_attack_status(
+                self.__opponent,
+                (
+                    decoded_message["coordinate"]["x"],
+                    decoded_message["coordinate"]["y"]
+                )
             )
+        elif decoded_message["type"] == "attack_result":
+            self.__handle_attack_result(decoded_message)
+        elif decoded_message["type"] == "launch_hit":
+            self.__handle_lauch_hit()
+        elif decoded_message["type"] == "end_game":
+            self.__handle_end_game(decoded_message)
+        else:
+            self.logger.info(decoded_message)
+
+    def __handle_codecs_offer(self, message):
+        # answered once, older servers do not offer anything and we stay on JSON
+        if "codecs" not in message or self.codec != CODEC_JSON:
+            return
+        codec = negotiate(message["codecs"], self.codecs)
+        if codec != CODEC_JSON:
+            self.server_socket.sendall(
+                pack_message({"type": "hello", "codecs": [codec]}))
+            self.codec = codec
+
+    def __handle_resume_offer(self, message):
+        # the first thing a restarted server hears from us is which seat is ours
+        self.resuming = False
+        self.resume_sent = True
+        codec = negotiate(message.get("codecs", [CODEC_JSON]), self.codecs)
+        self.server_socket.sendall(pack_message(
+            {"type": "resume", "session": self.session, "codecs": [codec]}))
+        self.codec = codec
+
+    def __handle_resume_game(self, message):
+        self.resume_sent = False
+        self.deferred_start = None
+        self.session = message["session"]
+        config = GameConfig.from_message(message["config"])
+        self.__player = Player(config.new_field())
+        self.__opponent = Player(config.new_field())
+        self.__player.getField().restore(message["field"])
+        self.__opponent.getField().restore(message["opponent_field"])
+        self.logger.info("Back in the game")
+        self.renderer.render(
+            self.__player.getField(), self.__opponent.getField())
+        if message["your_turn"]:
+            self.__handle_lauch_hit()
+        else:
+            self.logger.info(
+                "Opponenet's turn, waiting for him to launch a missile")
+
+    def __handle_resume_rejected(self, message):
+        # no saved game for our session: we play a new one
+        self.logger.info(message["message"])
+        self.resume_sent = False
+        if self.deferred_start is not None:
+            start_game, self.deferred_start = self.deferred_start, None
+            self.__handle_start_game(start_game)
+
+    def __handle_start_game(self, message):
+        # servers without game configs play the classic board
+        config = DEFAULT_GAME_CONFIG
+        if "config" in message:
+            config = GameConfig.from_message(message["config"])
+        if "session" in message:
+            self.session = message["session"]
+            self.logger.info(
+                f"Session {self.session}, rejoin with --resume {self.session} if the server restarts")
+        # a game called off before it began leaves our fleet on the old boards
+        if (config.getHeight(), config.getWidth()) != (self.__player.getField().getHeight(), self.__player.getField().getWidth()) or self.__player.getField().getShips():
+            self.__player = Player(config.new_field())
+            self.__opponent = Player(config.new_field())
+        self.prompt_and_send_player_ship_informationss(config.getFleet())
+
+    def __handle_receiving_ships_coordinates(self, client: Player, message):
+        client.getField().place_ships(
+            [
+                (
+                    Ship(
+                        ship["name"], ship["sign"], ship["height"], ship["width"]
+                    ),
+                    (ship["x_start"]+1, ship["y_start"]+1),
+                    ship["orientation"]
+                )
+                for ship in message["ships"]
+            ]
+        )
         self.logger.info(
             "Opponenet's ships have been placed. The war has began")
 
     def __handle_receive_attack(self, client: Player, coordinate: tuple[int, int]):
         x, y = coordinate
         status: bool = client.getField().hit_ship(x, y)
-        self.server_socket.send(
-            json.dumps(
+        self.server_socket.sendall(
+            pack_message(
                 {
                     "type": "attack_status",
                     "status": int(status),
@@ -439,20 +933,23 @@ class Client:
                         "x": x,
                         "y": y
                     }
-                }
-            ).encode()
+                },
+                self.codec
+            )
         )
-        Field.display_fields(
+        self.renderer.render(
             self.__player.getField(), self.__opponent.getField()
         )
 
     def __handle_receive_attack_status(self, opponent: Player, coordinate: tuple[int, int]):
         hit_x, hit_y = coordinate
-        status: bool = opponent.getField().hit_ship(hit_x, hit_y)
-        Field.display_fields(
+        result: HitResult = opponent.getField().fire(hit_x, hit_y)
+        self.renderer.render(
             self.__player.getField(), opponent.getField()
         )
-        if status == 1:
+        if result.getStatus() == HitResult.SUNK:
+            self.logger.info(f"Target was sunk: {result.getShipName()}!!")
+        elif result.is_hit():
             self.logger.info("Target was hit!!")
         else:
             self.logger.info("Target was not hit :(")
@@ -460,18 +957,31 @@ class Client:
             "Opponenet's turn, waiting for him to launch a missile"
         )
 
+    def __handle_attack_result(self, message):
+        # authoritative servers resolve the shot themselves and pass the turn in the same message
+        coordinate = (message["coordinate"]["x"], message["coordinate"]["y"])
+        if message["your_turn"]:
+            self.__player.getField().hit_ship(*coordinate)
+            self.renderer.render(
+                self.__player.getField(), self.__opponent.getField()
+            )
+            self.__handle_lauch_hit()
+        else:
+            self.__handle_receive_attack_status(self.__opponent, coordinate)
+
     def __handle_lauch_hit(self):
         x, y = self.__player.prompt_hit_coordinate()
-        self.server_socket.send(
-            json.dumps(
+        self.server_socket.sendall(
+            pack_message(
                 {
                     "type": "attack",
                     "coordinate": {
                         "x": x,
                         "y": y
                     }
-                }
-            ).encode()
+                },
+                self.codec
+            )
         )
 
     def __handle_end_game(self, message):
@@ -484,7 +994,11 @@ class Client:
                 message["attack_status"]["coordinate"]["y"]
             )
             self.__opponent.getField().hit_ship(x, y)
-        Field.display_fields(
+        if "attack" in message:
+            # the shot that ended the game landed on our board
+            self.__player.getField().hit_ship(
+                message["attack"]["x"], message["attack"]["y"])
+        self.renderer.render(
             self.__player.getField(), self.__opponent.getField(), show_opponent=True
         )
         if message["is_win"] == 1:
@@ -496,12 +1010,17 @@ class Client:
 
     def prompt_and_send_player_ship_informationss(self, default_ships: List[Ship]):
         try:
-            Field.display_fields(
-                self.__player.getField(), Field(10, 10))
-            for ship in default_ships:
-                self.__player.prompt_ship_placement(ship)
-                Field.display_fields(
-                    self.__player.getField(), Field(10, 10))
+            self.renderer.render(
+                self.__player.getField(), self.__opponent.getField())
+            if self.quick_play:
+                self.__player.getField().auto_place(default_ships)
+                self.renderer.render(
+                    self.__player.getField(), self.__opponent.getField())
+            else:
+                for ship in default_ships:
+                    self.__player.prompt_ship_placement(ship)
+                    self.renderer.render(
+                        self.__player.getField(), self.__opponent.getField())
 
             player_ships_informations = []
             for ship in self.__player.getField().getShips():
@@ -530,12 +1049,13 @@ class Client:
                             "orientation": orientation
                         }
                     )
-            self.server_socket.send(json.dumps(
+            self.server_socket.sendall(pack_message(
                 {
                     "type": "coordinates",
                     "ships": player_ships_informations
-                }
-            ).encode()
+                },
+                self.codec
+            )
             )
             self.logger.info(
                 "Waiting for the opponent to place his ships..")
@@ -546,7 +1066,8 @@ class Client:
     def _close_connection_from_client(self, message):
         try:
             self.logger.info("Closing connection with the server..")
-            self.server_socket.send(json.dumps({"type": message}).encode())
+            self.server_socket.sendall(
+                pack_message({"type": message}, self.codec))
         except socket.error as e:
             self.logger.error(f"Error connecting to the server{e}")
             pass
@@ -554,6 +1075,7 @@ class Client:
             self._close_socket()
 
     def _close_socket(self):
+        self.renderer.close()
         try:
             self.server_socket.shutdown(socket.SHUT_RDWR)
             self.server_socket.close()
@@ -568,13 +1090,17 @@ default_ships: List[Ship] = [
     Ship("FTR-88", "#", 4, 2),
     Ship("MO201", "o", 3, 2),
 ]
+# the classic game ends once 18 cells of a fleet are damaged
+DEFAULT_GAME_CONFIG = GameConfig(10, 10, default_ships, win_threshold=18)
 
 if __name__ == "__main__":
     close_event = threading.Event()
     client = Client(
         "127.0.0.1", 12345,
         close_event,
-        Player(Field(10, 10)), Player(Field(10, 10))
+        Player(DEFAULT_GAME_CONFIG.new_field()), Player(DEFAULT_GAME_CONFIG.new_field()),
+        quick_play="--quick-play" in sys.argv,
+        session=sys.argv[sys.argv.index("--resume") + 1] if "--resume" in sys.argv else None
     )
     try:
         client.connect()
@@ -0,0 +1,195 @@
+import logging
+from typing import List, Optional, Tuple
+from player import CoordinateTakenException, Field, GameConfig, InconsistentCoordinatesException, Ship
+
+logging.basicConfig(level=logging.INFO,
+                    format='%(name)s: %(message)s',
+                    )
+
+WIN_MESSAGE = "Bravo. You win !!!"
+LOSS_MESSAGE = "You lost. Better luck next time :`("
+QUIT_MESSAGE = "Your opponent has quit the game. You win :)"
+REJECTED_MESSAGE = "Your fleet does not fit this game. You lost."
+OPPONENT_REJECTED_MESSAGE = "Your opponent sent a fleet that does not fit this game. You win :)"
+
+# (player slot, message) pairs for the transport to deliver, in order
+Replies = List[Tuple[int, dict]]
+
+
+class InvalidFleetError(Exception):
+    pass
+
+
+class Rules:
+    # what happens in a game, whichever server moves its messages
+    def __init__(self, config: GameConfig, authoritative: bool, fields: List[Field]):
+        self.__config = config
+        self.__authoritative = authoritative
+        self.__fields = fields
+        # slot of the player to fire next, None until both fleets are down
+        self.__turn: Optional[int] = None
+        self.__winner: Optional[int] = None
+        self.__over = False
+
+    def getTurn(self) -> Optional[int]:
+        return self.__turn
+
+    def setTurn(self, turn: int):
+        self.__turn = turn
+
+    def getWinner(self) -> Optional[int]:
+        return self.__winner
+
+    def isOver(self) -> bool:
+        return self.__over
+
+    def place_fleet(self, slot: int, message: dict, starting_slot: int) -> dict:
+        try:
+            # exactly the ships of the game, a missing one would never be sunk
+            sent = sorted(
+                (ship["name"], ship["height"], ship["width"]) for ship in message["ships"]
+            )
+            expected = sorted(
+                (ship.getName(), ship.getHeight(), ship.getWidth()) for ship in self.__config.getFleet()
+            )
+            if sent != expected:
+                raise InvalidFleetError(
+                    f"Fleet {sent} does not match the game fleet {expected}")
+            self.__fields[slot].place_ships(
+                [
+                    (
+                        Ship(
+                            ship["name"], ship["sign"], ship["height"], ship["width"]
+                        ),
+                        (ship["x_start"]+1, ship["y_start"]+1),
+                        ship["orientation"]
+                    )
+                    for ship in message["ships"]
+                ]
+            )
+        except (KeyError, TypeError, ValueError, IndexError, CoordinateTakenException, InconsistentCoordinatesException) as e:
+            raise InvalidFleetError(f"Invalid fleet: {e}") from e
+        message["starting"] = int(slot == starting_slot)
+        return message
+
+    def start(self, starting_slot: int):
+        # "starting" rides on a player's own coordinates, which go to the opponent:
+        # the other slot fires first
+        self.__turn = 1 - starting_slot
+
+    def attack(self, slot: int, message: dict) -> Optional[Replies]:
+        # only the player whose turn it is may fire, once per turn
+        if self.__over or slot != self.__turn:
+            return None
+        opponent = 1 - slot
+        coordinate = message["coordinate"]
+        result = self.__fields[opponent].fire(coordinate["x"], coordinate["y"])
+        # the defender's turn from now on, even before a relayed status comes back
+        self.__turn = opponent
+        if not self.__authoritative:
+            return [(opponent, message)]
+
+        # the server's boards decide: both players hear the outcome at once and the turn passes
+        status = {
+            "type": "attack_status",
+            "status": int(result.is_hit()),
+            "coordinate": coordinate
+        }
+        end_game = self.__end_game_if_over(
+            slot, {"attack_status": status}, {"attack": coordinate})
+        if end_game:
+            return end_game
+        attack_result = {
+            "type": "attack_result",
+            "coordinate": coordinate,
+            "status": int(result.is_hit()),
+            "result": result.getStatus(),
+            "ships": result.getShipNames()
+        }
+        return [
+            (slot, {**attack_result, "your_turn": 0}),
+            (opponent, {**attack_result, "your_turn": 1})
+        ]
+
+    def attack_status(self, slot: int, message: dict) -> Replies:
+        if self.__authoritative or self.__over:
+            # the defender has no say once the server resolves shots
+            return []
+        end_game = self.__end_game_if_over(
+            slot, None, {"attack_status": message})
+        if end_game:
+            return end_game
+        return [(1 - slot, message), (slot, {"type": "launch_hit"})]
+
+    def quit(self, slot: int) -> Replies:
+        self.__over = True
+        self.__winner = 1 - slot
+        return [
+            (
+                1 - slot,
+                {
+                    "type": "end_game",
+                    "is_win": int(True),
+                    "message": QUIT_MESSAGE
+                }
+            )
+        ]
+
+    def reject_fleet(self, slot: int) -> Replies:
+        self.__over = True
+        self.__winner = 1 - slot
+        return [
+            (
+                slot,
+                {
+                    "type": "end_game",
+                    "is_win": int(False),
+                    "message": REJECTED_MESSAGE
+                }
+            ),
+            (
+                1 - slot,
+                {
+                    "type": "end_game",
+                    "is_win": int(True),
+                    "message": OPPONENT_REJECTED_MESSAGE
+                }
+            )
+        ]
+
+    def __end_game_if_over(self, slot: int, player_details: dict = None, opponent_details: dict = None) -> Replies:
+        # the details let each player replay the last shot on its boards
+        player_field, opponent_field = self.__fields[slot], self.__fields[1 - slot]
+        win_threshold = self.__config.getWinThreshold()
+        if not (player_field.is_defeated(win_threshold) or opponent_field.is_defeated(win_threshold)):
+            return []
+        player_damaged_coordinates_count = player_field.count_damaged_coordinates()
+        opponent_damaged_coordinates_count = opponent_field.count_damaged_coordinates()
+        player_is_win = int(player_damaged_coordinates_count <=
+                            opponent_damaged_coordinates_count)
+        opponent_is_win = int(
+            opponent_damaged_coordinates_count <= player_damaged_coordinates_count)
+        if player_is_win == opponent_is_win:
+            return []
+        self.__over = True
+        self.__winner = slot if player_is_win else 1 - slot
+        return [
+            (
+                slot,
+                {
+                    "type": "end_game",
+                    "is_win": player_is_win,
+                    "message": WIN_MESSAGE if player_is_win else LOSS_MESSAGE,
+                    **(player_details or {})
+                }
+            ),
+            (
+                1 - slot,
+                {
+                    "type": "end_game",
+                    "is_win": opponent_is_win,
+                    "message": WIN_MESSAGE if opponent_is_win else LOSS_MESSAGE,
+                    **(opponent_details or {})
+                }
+            )
+        ]
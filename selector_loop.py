@@ -0,0 +1,82 @@
+import logging
+import selectors
+import socket
+import threading
+from collections import deque
+from typing import List, Optional
+
+logging.basicConfig(level=logging.INFO,
+                    format='%(name)s: %(message)s',
+                    )
+
+SELECT_TIMEOUT = 0.5
+
+
+class SelectorLoop:
+    # a single thread over a selector; other threads hand it work with _submit and a wakeup byte
+    def __init__(self, name: str):
+        self._selector = selectors.DefaultSelector()
+        self.__waiting: deque = deque()
+        self.__lock = threading.Lock()
+        self.__wakeup_reader, self.__wakeup_writer = socket.socketpair()
+        self.__wakeup_reader.setblocking(False)
+        self.__wakeup_writer.setblocking(False)
+        self._selector.register(self.__wakeup_reader, selectors.EVENT_READ)
+        self.__close_event = threading.Event()
+        self.__thread: Optional[threading.Thread] = None
+        self.logger = logging.getLogger(name)
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        self.__close_event.set()
+        self.__wake()
+
+    def _submit(self, item):
+        with self.__lock:
+            self.__waiting.append(item)
+        self.__wake()
+
+    def _watched(self) -> List[selectors.SelectorKey]:
+        return [
+            key for key in self._selector.get_map().values()
+            if key.fileobj is not self.__wakeup_reader
+        ]
+
+    def _on_ready(self, key: selectors.SelectorKey):
+        raise NotImplementedError
+
+    def _on_submitted(self, item):
+        raise NotImplementedError
+
+    def _on_close(self):
+        pass
+
+    def __wake(self):
+        try:
+            self.__wakeup_writer.send(b"\0")
+        except (BlockingIOError, OSError):
+            pass
+
+    def __run(self):
+        while not self.__close_event.is_set():
+            for key, _ in self._selector.select(SELECT_TIMEOUT):
+                if key.fileobj is self.__wakeup_reader:
+                    try:
+                        while self.__wakeup_reader.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                else:
+                    self._on_ready(key)
+            with self.__lock:
+                waiting = list(self.__waiting)
+                self.__waiting.clear()
+            for item in waiting:
+                self._on_submitted(item)
+        self._on_close()
+        self._selector.close()
+        self.__wakeup_reader.close()
+        self.__wakeup_writer.close()
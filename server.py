@@ -1,27 +1,58 @@
+import argparse
+import itertools
 import json
+import os
 from random import randint
+import secrets
+import selectors
+import signal
 import socket
 import sys
 import threading
 import logging
-from time import sleep, time
-from typing import List
-from player import Field, Ship
+from time import perf_counter
+from typing import Dict, List, Optional
+from bot import Bot, BotRunner
+from codec import CODEC_JSON, SUPPORTED_CODECS, DecodeError, negotiate
+from framing import FrameTooLargeError, MessageReader, pack_message
+from matchmaking import DEFAULT_RATING, Matchmaker, PairingPolicy
+from metrics import MetricsServer, ServerMetrics
+from outbound import DEFAULT_HIGH_WATER_MARK, OutboundFlusher, OutboundQueue, SlowConsumerError
+from player import DEFAULT_GAME_CONFIG, Field, GameConfig
+from rules import InvalidFleetError, Replies, Rules
+from timer_wheel import TimerWheel
 
 
 logging.basicConfig(level=logging.INFO,
                     format='%(name)s: %(message)s',
                     )
 
-MAX_DAMAGED_COORDINATES = 18
-FIELD_HEIGHT = 10
-FIELD_WIDTH = 10
+MAX_DAMAGED_COORDINATES = DEFAULT_GAME_CONFIG.getWinThreshold()
+FIELD_HEIGHT = DEFAULT_GAME_CONFIG.getHeight()
+FIELD_WIDTH = DEFAULT_GAME_CONFIG.getWidth()
+# anything else is counted as "other" so clients cannot grow the metrics
+MESSAGE_TYPES = ("attack", "attack_status", "coordinates",
+                 "hello", "resume", "close", "exit")
+# seconds players of a saved game get to come back after a restart
+DEFAULT_RESUME_WINDOW = 120
+# lobby clients of a restarted server are read for resume messages from the next poll on
+RESUME_POLL = 0.1
 
 
 class TooManyPlayersError(Exception):
     pass
 
 
+def is_connected(sock: socket.socket) -> bool:
+    # peek without blocking: b'' means the peer has closed the connection
+    try:
+        return len(sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT)) > 0
+    except BlockingIOError:
+        return True
+    except OSError:
+        return False
+
+
 class Socket_address():
     def __init__(self, ip, port):
         self.__ip = ip
@@ -46,17 +77,42 @@ class Socket_address():
 
 
 class Client():
-    def __init__(self, socket: socket.socket, address: Socket_address):
+    def __init__(self, socket: socket.socket, address: Socket_address, id: int = 0, field_backend=Field, high_water_mark: int = DEFAULT_HIGH_WATER_MARK, game_config: GameConfig = DEFAULT_GAME_CONFIG, bot: bool = False):
+        self.__id: int = id
         self.__socket: socket = socket
         self.__address: Socket_address = address
-        self.__field: Field = Field(FIELD_WIDTH, FIELD_HEIGHT)
-        self.__blocking_event = threading.Event()
+        self.__reader: MessageReader = MessageReader(socket)
+        self.__outbound: OutboundQueue = OutboundQueue(socket, high_water_mark)
+        self.__field: Field = game_config.new_field(field_backend)
+        self.__rating: int = DEFAULT_RATING
+        self.__heartbeat: Optional[int] = None
+        # timer handing a lonely lobby client a bot opponent
+        self.__bot_timer: Optional[int] = None
+        self.__bot: bool = bot
+        self.__paired: bool = False
+        self.__connected_at: float = perf_counter()
+        # wire encoding used for messages sent to this client
+        self.__codec: str = CODEC_JSON
+        # handed out with start_game, claims the seat back after a server restart
+        self.__session: str = secrets.token_hex(16)
+
+    def getId(self) -> int:
+        return self.__id
 
     def getSocket(self) -> socket.socket:
         return self.__socket
 
     def setSocket(self, socket):
         self.__socket = socket
+        self.__reader = MessageReader(socket)
+        self.__outbound = OutboundQueue(
+            socket, self.__outbound.getHighWaterMark())
+
+    def getReader(self) -> MessageReader:
+        return self.__reader
+
+    def getOutbound(self) -> OutboundQueue:
+        return self.__outbound
 
     def getAddress(self):
         return self.__address
@@ -70,11 +126,53 @@ class Client():
     def setField(self, field: Field):
         self.__field = field
 
+    def getRating(self):
+        return self.__rating
+
+    def setRating(self, rating: int):
+        self.__rating = rating
+
     def isPlacedShips(self):
         return len(self.getField().getShips()) != 0
 
-    def getBlockingEvent(self):
-        return self.__blocking_event
+    def isConnected(self):
+        return is_connected(self.__socket)
+
+    def getCodec(self):
+        return self.__codec
+
+    def setCodec(self, codec: str):
+        self.__codec = codec
+
+    def getConnectedAt(self):
+        return self.__connected_at
+
+    def getSession(self):
+        return self.__session
+
+    def setSession(self, session: str):
+        self.__session = session
+
+    def getHeartbeat(self):
+        return self.__heartbeat
+
+    def setHeartbeat(self, timer_id: Optional[int]):
+        self.__heartbeat = timer_id
+
+    def getBotTimer(self):
+        return self.__bot_timer
+
+    def setBotTimer(self, timer_id: Optional[int]):
+        self.__bot_timer = timer_id
+
+    def isBot(self):
+        return self.__bot
+
+    def isPaired(self):
+        return self.__paired
+
+    def setPaired(self, paired: bool):
+        self.__paired = paired
 
     def __eq__(self, client):
         if isinstance(client, Client):
@@ -83,62 +181,113 @@ class Client():
 
 
 class Server:
-    def __init__(self, server_address, close_event):
+    def __init__(self, server_address, close_event, pairing_policy: PairingPolicy = None, heartbeat_interval: float = None, field_backend=Field, high_water_mark: int = DEFAULT_HIGH_WATER_MARK, reuse_port: bool = False, game_config: GameConfig = DEFAULT_GAME_CONFIG, authoritative: bool = False, metrics_address=None, bot_after: float = None, snapshot_path: str = None, snapshot_interval: float = None, resume_window: float = DEFAULT_RESUME_WINDOW):
         self.host = server_address[0]
         self.port = server_address[1]
+        # player.Field or bitboard.BitboardField
+        self.field_backend = field_backend
+        # board and fleet of every game hosted here
+        self.game_config = game_config
+        # shots are resolved on the server's boards instead of by the defender
+        self.authoritative = authoritative
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.__clients: List[Client] = list()
+        # several worker processes may listen on the same port, see cluster.py
+        self.reuse_port = reuse_port
+        # connected clients keyed by connection id
+        self.__clients: Dict[int, Client] = dict()
+        self.__connection_ids = itertools.count(1)
         self.games: List[Game] = list()
         self.close_event = close_event
         self.lock = threading.Lock()
+        self.matchmaker = Matchmaker(
+            on_match=self.start_match,
+            policy=pairing_policy,
+            is_alive=self.__is_client_alive
+        )
+        # lobby heartbeats of every waiting client share a single timer thread
+        self.heartbeat_interval = heartbeat_interval
+        self.timer_wheel = TimerWheel()
+        # unread bytes a client may pile up before it is dropped
+        self.high_water_mark = high_water_mark
+        self.flusher = OutboundFlusher()
+        # a client left alone in the lobby this many seconds plays a bot instead
+        self.bot_after = bot_after
+        self.bots = BotRunner()
+        self.__bot_ids = itertools.count(1)
+        # games in progress are saved there every snapshot_interval seconds and on shutdown,
+        # and picked up again on start
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self.resume_window = resume_window
+        # one save at a time, all of them writing the same temporary file; none after the last one
+        self.__snapshot_lock = threading.Lock()
+        self.__snapshot_closed = False
+        # saved games waiting for their players: session -> (pending game, slot)
+        self.__resumable: Dict[str, tuple[dict, int]] = dict()
+        self.__pending_games: List[dict] = list()
+        # while saved games wait, lobby clients are read on one thread for a resume message;
+        # claiming a seat and pairing happen under this lock, so a client only gets one game
+        self.__lobby_lock = threading.RLock()
+        self.__resume_watch: List[Client] = list()
+        self.metrics = ServerMetrics()
+        self.metrics.active_games.setFunction(lambda: len(self.games))
+        self.metrics.lobby_size.setFunction(
+            lambda: self.matchmaker.getLobbySize())
+        # Prometheus text on http://<metrics_address>/metrics when set
+        self.metrics_server: Optional[MetricsServer] = None
+        if metrics_address is not None:
+            self.metrics_server = MetricsServer(self.metrics, metrics_address)
         self.logger = logging.getLogger("Server")
 
     def getClients(self):
         return self.__clients
 
+    def getClient(self, client_id: int) -> Optional[Client]:
+        return self.__clients.get(client_id)
+
+    def remove_client(self, client: Client) -> bool:
+        with self.lock:
+            return self.__clients.pop(client.getId(), None) is not None
+
     def start(self):
+        if self.snapshot_path is not None and os.path.exists(self.snapshot_path):
+            self.load_snapshot()
         self.server_socket.setsockopt(
             socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.reuse_port:
+            self.server_socket.setsockopt(
+                socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         self.server_socket.bind((self.host, self.port))
-        self.server_socket.listen(4)
+        self.server_socket.listen(128)
+        self.matchmaker.start()
+        self.flusher.start()
+        if self.metrics_server is not None:
+            self.metrics_server.start()
+        if self.bot_after is not None:
+            self.bots.start()
+        if self.snapshot_interval is not None and self.snapshot_path is not None:
+            self.timer_wheel.schedule(
+                self.snapshot_interval, self.save_snapshot, interval=self.snapshot_interval)
+        if self.heartbeat_interval is not None or self.bot_after is not None or self.snapshot_interval is not None or self.__pending_games:
+            self.timer_wheel.start()
+        if self.__pending_games:
+            threading.Thread(target=self.__watch_resumes, daemon=True).start()
         self.logger.info(f"Listening on {self.host}:{self.port}")
         while not self.close_event.is_set():
             try:
                 client_socket, client_address = self.server_socket.accept()
+                # turns are single small frames, never hold them back waiting for an ACK
+                client_socket.setsockopt(
+                    socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                self.metrics.connections.inc()
                 self.logger.info(
                     f"Connection from client {
                         client_address[0]}:{client_address[1]}"
                 )
 
-                new_client = Client(
-                    socket=client_socket,
-                    address=client_address
+                self.__handle_client(
+                    self.create_client(client_socket, client_address)
                 )
-                with self.lock:
-                    self.__clients.append(new_client)
-
-                # # assign a thread for each new subscribed client
-                client_handler = threading.Thread(
-                    target=self.__handle_client, args=(new_client,)
-                )
-                client_handler.start()
-
-                if len(self.__clients) % 2 == 0:
-                    clients_start_index = len(
-                        self.__clients) - (2 * len(self.games))
-                    player1 = self.__clients[-clients_start_index]
-                    player2 = self.__clients[-clients_start_index + 1]
-                    new_game = Game(self)
-                    new_game.addPlayer(player1)
-                    new_game.addPlayer(player2)
-                    with self.lock:
-                        self.games.append(new_game)
-                    self.logger.info(
-                        f"New game - Player {player1.getAddress()} VS {player2.getAddress()}")
-                    new_game_thread = threading.Thread(
-                        target=new_game.start_game
-                    )
-                    new_game_thread.start()
 
             except KeyboardInterrupt:
                 self._close_server()
@@ -150,69 +299,392 @@ class Server:
                     self.logger.error(
                         f"Error accepting or handling new connections: {e}")
 
+    def create_client(self, client_socket: socket.socket, client_address, bot: bool = False) -> Client:
+        new_client = Client(
+            socket=client_socket,
+            address=client_address,
+            id=next(self.__connection_ids),
+            field_backend=self.field_backend,
+            high_water_mark=self.high_water_mark,
+            game_config=self.game_config,
+            bot=bot
+        )
+        with self.lock:
+            self.__clients[new_client.getId()] = new_client
+        return new_client
+
+    def start_match(self, player1: Client, player2: Client, resume_turn: int = None):
+        # with a resume_turn both players are back in a saved game and it picks up from there
+        with self.__lobby_lock:
+            # one of them may have claimed a saved seat since the matchmaker picked them
+            if resume_turn is None and (player1.isPaired() or player2.isPaired()):
+                for player in (player1, player2):
+                    if not player.isPaired():
+                        self.matchmaker.enqueue(player)
+                return
+            for player in (player1, player2):
+                player.setPaired(True)
+        for player in (player1, player2):
+            self.__cancel_heartbeat(player)
+            self.__cancel_bot_timer(player)
+            self.metrics.lobby_wait.observe(
+                perf_counter() - player.getConnectedAt())
+        self.metrics.games_started.inc()
+        new_game = Game(self)
+        new_game.addPlayer(player1)
+        new_game.addPlayer(player2)
+        with self.lock:
+            self.games.append(new_game)
+        self.logger.info(
+            f"New game - Player {player1.getAddress()} VS {player2.getAddress()}")
+        # start_game is pushed to both players as soon as they are paired
+        if resume_turn is None:
+            new_game_thread = threading.Thread(
+                target=new_game.start_game
+            )
+        else:
+            new_game_thread = threading.Thread(
+                target=new_game.resume_game, args=(resume_turn,)
+            )
+        new_game_thread.start()
+
+    def __is_client_alive(self, client: Client):
+        # back in a saved game since it was queued
+        if client.isPaired():
+            return False
+        # dead lobby clients are dropped when the matchmaker skips them
+        if client.isConnected():
+            return True
+        self.__cancel_heartbeat(client)
+        self.__cancel_bot_timer(client)
+        self._disconnect_client(client)
+        return False
+
     # handle client
     def __handle_client(self, client: Client):
         try:
-            time_interval = 3
-            while not client.getBlockingEvent().is_set():
-                client.getSocket().send(
-                    json.dumps(
-                        {
-                            "type": "wait_for_opponent",
-                            "message": f"Server << Waiting for your opponent to join.."
-                        }
-                    )
-                    .encode()
-                )
-            # client.getBlockingEvent().wait()
-                time_interval += 3
-                sleep(time_interval)
-
-            # client.getSocket().send("Server << Opponent has joined. Here we go!!".encode())
-            client.getBlockingEvent().clear()
-            client.getBlockingEvent().wait()
-
-        except KeyboardInterrupt:
-            self._close_server()
+            self.send_message(client, self.__wait_for_opponent_message())
         except socket.error as e:
             # send a close signal to client's socket when ERROR
             self.logger.warning(f"Error handling client: {e}")
             # close connection with client on ERROR
+            self.remove_client(client)
+            return
+
+        if self.__pending_games and not client.isBot():
+            with self.__lobby_lock:
+                self.__resume_watch.append(client)
+        self.__enqueue(client)
+
+    def __enqueue(self, client: Client):
+        if self.bot_after is not None and not client.isBot():
+            client.setBotTimer(
+                self.timer_wheel.schedule(
+                    self.bot_after, lambda: self.__add_bot(client))
+            )
+        if self.heartbeat_interval is not None and not client.isBot():
+            client.setHeartbeat(
+                self.timer_wheel.schedule(
+                    self.heartbeat_interval,
+                    lambda: self.__send_heartbeat(client),
+                    interval=self.heartbeat_interval
+                )
+            )
+        # pairing happens on the matchmaker's thread
+        self.matchmaker.enqueue(client)
+
+    def __watch_resumes(self):
+        # right after a restart a lobby client may claim its seat in a saved game
+        selector = selectors.DefaultSelector()
+        while self.__pending_games and not self.close_event.is_set():
+            with self.__lobby_lock:
+                for client in self.__resume_watch:
+                    try:
+                        selector.register(
+                            client.getSocket(), selectors.EVENT_READ, client)
+                    except (OSError, ValueError):
+                        pass
+                    except KeyError:
+                        # still registered from before a game that was called off
+                        pass
+                self.__resume_watch.clear()
+            for key, _ in selector.select(RESUME_POLL):
+                if not self.__read_lobby_client(key.data):
+                    selector.unregister(key.fileobj)
+        selector.close()
+
+    def __read_lobby_client(self, client: Client) -> bool:
+        # False once the client is no longer in the lobby
+        with self.__lobby_lock:
+            if client.isPaired():
+                return False
+            try:
+                messages = client.getReader().receive_available()
+            except (socket.error, DecodeError, FrameTooLargeError) as e:
+                self.logger.warning(f"Error handling client: {e}")
+                self.remove_client(client)
+                return False
+            if messages is None:
+                self._disconnect_client(client)
+                return False
+            for message in messages:
+                message_type = message["type"]
+                if message_type in ("hello", "resume"):
+                    client.setCodec(negotiate(message.get("codecs", [])))
+                if message_type == "resume":
+                    if self.resume_client(client, message.get("session")):
+                        return False
+                    self.logger.info(
+                        f"{client.getAddress()} has no saved game to resume")
+                elif message_type in ("close", "exit"):
+                    self._disconnect_client(client)
+                    return False
+                elif message_type != "hello":
+                    self.logger.warning(
+                        f"Unexpected {message_type} message from {client.getAddress()} in the lobby")
+            return True
+
+    def resume_client(self, client: Client, session: str) -> bool:
+        # from the lobby, or from a game the matchmaker started before the claim was read
+        with self.__lobby_lock:
             with self.lock:
-                self.__clients.remove(client)
+                seat = self.__resumable.get(session)
+            ready = None
+            if seat is not None:
+                pending, slot = seat
+                saved = pending["snapshot"]["players"][slot]
+                paired, field = client.isPaired(), client.getField()
+                # out of the lobby from now on, even while the opponent is still away
+                client.setPaired(True)
+                client.setField(self.game_config.new_field(self.field_backend))
+                client.getField().restore(saved["field"])
+                with self.lock:
+                    # the seat may have expired in the meantime
+                    if self.__resumable.pop(session, None) is not None:
+                        pending["clients"][slot] = client
+                        ready = all(pending["clients"])
+                        if ready:
+                            self.__pending_games.remove(pending)
+                if ready is None:
+                    client.setPaired(paired)
+                    client.setField(field)
+            if ready is None:
+                self.send_message(client, {
+                    "type": "resume_rejected",
+                    "message": "Server << No saved game for this session"
+                })
+                return False
+            client.setSession(session)
+            client.setRating(saved["rating"])
+        self.__cancel_heartbeat(client)
+        self.__cancel_bot_timer(client)
+        self.logger.info(f"{client.getAddress()} is back in a saved game")
+        if not ready:
+            self.send_message(client, {
+                "type": "wait_for_opponent",
+                "message": f"Server << Waiting for your opponent to come back.."
+            })
+            return True
+        self.timer_wheel.cancel(pending["timer"])
+        self.start_match(*pending["clients"], pending["snapshot"]["turn"])
+        return True
+
+    def __expire_resume(self, pending: dict):
+        # the opponent did not make it back in time, whoever did wins
+        with self.lock:
+            if pending not in self.__pending_games:
+                return
+            self.__pending_games.remove(pending)
+            for player in pending["snapshot"]["players"]:
+                self.__resumable.pop(player["session"], None)
+        for client in pending["clients"]:
+            if client is None:
+                continue
+            self.send_message(client, {
+                "type": "end_game",
+                "is_win": int(True),
+                "message": "Your opponent did not come back. You win :)"
+            })
+            self._disconnect_client(client)
+
+    def load_snapshot(self):
+        try:
+            with open(self.snapshot_path) as snapshot_file:
+                snapshot = json.load(snapshot_file)
+        except (OSError, ValueError) as e:
+            self.logger.error(f"Could not read snapshot {self.snapshot_path}: {e}")
+            return
+        if snapshot.get("config") != self.game_config.to_message() or snapshot.get("authoritative") != self.authoritative:
+            self.logger.warning(
+                f"Snapshot {self.snapshot_path} was taken with other game settings, ignored")
+            return
+        with self.lock:
+            for saved_game in snapshot["games"]:
+                pending = {
+                    "snapshot": saved_game,
+                    "text": json.dumps(saved_game, separators=(",", ":")),
+                    "clients": [None, None]
+                }
+                pending["timer"] = self.timer_wheel.schedule(
+                    self.resume_window, lambda pending=pending: self.__expire_resume(pending))
+                self.__pending_games.append(pending)
+                for slot, player in enumerate(saved_game["players"]):
+                    self.__resumable[player["session"]] = (pending, slot)
+        self.logger.info(
+            f"{len(snapshot['games'])} saved games waiting for their players")
+
+    def save_snapshot(self, last: bool = False) -> int:
+        # games only get encoded again after a shot, the rest is joining their cached JSON;
+        # written aside and renamed over the previous one, a crash never leaves half a file
+        with self.__snapshot_lock:
+            if self.__snapshot_closed:
+                return 0
+            self.__snapshot_closed = last
+            return self.__write_snapshot()
+
+    def __write_snapshot(self) -> int:
+        with self.lock:
+            games = list(self.games)
+            # saved games still waiting for their players survive another restart
+            saved_games = [pending["text"] for pending in self.__pending_games]
+        for game in games:
+            saved_game = game.to_snapshot()
+            if saved_game is not None:
+                saved_games.append(saved_game)
+        settings = json.dumps({
+            "config": self.game_config.to_message(),
+            "authoritative": self.authoritative
+        }, separators=(",", ":"))
+        temporary_path = f"{self.snapshot_path}.tmp"
+        try:
+            with open(temporary_path, "w") as snapshot_file:
+                snapshot_file.write(f'{settings[:-1]},"games":[')
+                snapshot_file.write(",".join(saved_games))
+                snapshot_file.write("]}")
+            os.replace(temporary_path, self.snapshot_path)
+        except OSError as e:
+            self.logger.error(f"Could not write snapshot {self.snapshot_path}: {e}")
+        return len(saved_games)
+
+    def return_to_lobby(self, client: Client):
+        # its game was called off before the first shot
+        if self.getClient(client.getId()) is None:
+            return
+        client.setPaired(False)
+        client.setField(self.game_config.new_field(self.field_backend))
+        if client.isBot():
+            # bots only join for a lonely client, that one is gone
+            self.send_message(client, {"type": "close"})
+            self._disconnect_client(client)
+            return
+        self.__handle_client(client)
 
-    def broadcast(self, message, clients: list[Client]):
+    def __add_bot(self, client: Client):
+        client.setBotTimer(None)
+        if client.isPaired() or not client.isConnected():
+            return
+        # the bot joins the lobby like any client and the matchmaker pairs it
+        bot_client = self.create_client(
+            self.bots.add(Bot()), ("bot", next(self.__bot_ids)), bot=True)
+        bot_client.setRating(client.getRating())
+        self.logger.info(
+            f"Bot {bot_client.getAddress()} joins the lobby for {client.getAddress()}")
+        self.__handle_client(bot_client)
+
+    def __wait_for_opponent_message(self):
+        return {
+            "type": "wait_for_opponent",
+            "message": f"Server << Waiting for your opponent to join..",
+            # clients answer with a hello message to pick one
+            "codecs": SUPPORTED_CODECS
+        }
+
+    def __send_heartbeat(self, client: Client):
+        try:
+            self.send_message(client, self.__wait_for_opponent_message())
+        except socket.error as e:
+            self.logger.warning(f"Error handling client: {e}")
+            self.__cancel_heartbeat(client)
+            self.remove_client(client)
+
+    def __cancel_heartbeat(self, client: Client):
+        if client.getHeartbeat() is not None:
+            self.timer_wheel.cancel(client.getHeartbeat())
+            client.setHeartbeat(None)
+
+    def __cancel_bot_timer(self, client: Client):
+        if client.getBotTimer() is not None:
+            self.timer_wheel.cancel(client.getBotTimer())
+            client.setBotTimer(None)
+
+    def send_message(self, client: Client, message: dict):
+        self.__send_frame(client, pack_message(message, client.getCodec()))
+
+    def broadcast(self, message: dict, clients: list[Client]):
+        # encode once per codec in use
+        frames = dict()
         for client in clients:
             try:
-                client.getSocket().send(message)
+                if client.getCodec() not in frames:
+                    frames[client.getCodec()] = pack_message(
+                        message, client.getCodec())
+                self.__send_frame(client, frames[client.getCodec()])
             except Exception as e:
                 self.logger.error(f"Error broadcasting to client: {e}")
                 # close connection with client on ERROR
-                with self.lock:
-                    self.__clients.remove(client)
+                self.remove_client(client)
 
-    def delete_client_from_clients_list(self, client_to_delete: Client):
-        return [client for client in self.__clients if client.getUsername() != client_to_delete.getUsername()]
+    def __send_frame(self, client: Client, frame: bytes):
+        # never blocks: whatever the socket does not take now is written by the flusher thread
+        try:
+            if client.getOutbound().push(frame):
+                self.flusher.watch(
+                    client.getOutbound(),
+                    lambda e: self.__drop_client(client, e)
+                )
+        except SlowConsumerError as e:
+            self.__drop_client(client, e)
+
+    def __drop_client(self, client: Client, reason: OSError):
+        self.logger.warning(
+            f"Dropping client {client.getAddress()}: {reason}")
+        self.__cancel_heartbeat(client)
+        self.remove_client(client)
+        # wakes up the thread blocked reading from this client
+        try:
+            client.getSocket().shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
 
     def _disconnect_client(self, client: Client):
         # close connection with client
-        with self.lock:
-            self.__clients.remove(client)
+        if self.remove_client(client):
             self.logger.info(
                 f"{client.getAddress()} has disconnected")
 
     def _close_server(self):
         self.logger.warning(
             f"Server is shutting down. Informing clients...")
+        self.timer_wheel.stop()
+        if self.snapshot_path is not None:
+            self.logger.warning(
+                f"Saved {self.save_snapshot(last=True)} games to {self.snapshot_path}")
+        self.matchmaker.stop()
+        self.flusher.stop()
+        self.bots.stop()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
         # send closing message to all subscribed clients
-        for client in self.__clients:
-            client_username = client.getUsername()
+        with self.lock:
+            clients = list(self.__clients.values())
+        for client in clients:
+            client_username = client.getAddress()
             try:
                 self.logger.warning(
                     f"Informing client {client_username}...")
                 # close connection from client side
                 client_socket = client.getSocket()
-                client_socket.send("close".encode())
+                client.getOutbound().push(pack_message({"type": "close"}))
                 # close connection from server side
                 client_socket.shutdown(socket.SHUT_RDWR)
                 client_socket.close()
@@ -241,11 +713,24 @@ class Game:
 
     def __init__(self, server: Server):
         self.players: List[Client] = list()
+        # connection id -> player slot inside this game
+        self.__slots: Dict[int, int] = dict()
         self.gameServer = server
+        self.config: GameConfig = server.game_config
+        self.authoritative: bool = server.authoritative
+        self.metrics: ServerMetrics = server.metrics
+        # when the attack now waiting for its outcome reached the server
+        self.__attack_received_at: Optional[float] = None
+        self.__rules: Optional[Rules] = None
+        # players who claimed a saved seat instead of sending their fleet, the game is called off
+        self.__resumed: List[Client] = list()
+        # JSON of the game, reused by every snapshot until the next shot
+        self.__snapshot: Optional[str] = None
         self.lock = threading.Lock()
         self.game_close_event = threading.Event()
         self.logger = logging.getLogger("Game")
         Game.id += 1
+        self.id = Game.id
 
     def start_game(self):
         player1, player2 = self.players
@@ -257,13 +742,19 @@ class Game:
         )
         # choose the player who is gonna launch the first hit randomly
         starting_client_turn = randint(0, 1)
+        self.__rules = Rules(self.config, self.authoritative,
+                             [player1.getField(), player2.getField()])
         try:
-            self.gameServer.broadcast(json.dumps(
-                {
-                    "type": "start_game",
-                }
-            ).encode(), [player1, player2]
-            )
+            for player in (player1, player2):
+                self.gameServer.send_message(
+                    player,
+                    {
+                        "type": "start_game",
+                        "config": self.config.to_message(),
+                        "authoritative": self.authoritative,
+                        "session": player.getSession()
+                    }
+                )
             # assign a thread for each player to retrieve their coordinates
             player1__handle_receive_coordinates = threading.Thread(
                 target=self.__handle_receive_coordinates, args=(
@@ -279,66 +770,132 @@ class Game:
             # wait for both threads to finish
             player1__handle_receive_coordinates.join()
             player2__handle_receive_coordinates.join()
+            if self.__resumed:
+                self.__call_off()
+                return
 
-            # send player's coordinates to the other player
-            for player_coordinates in players_coordinates:
-                coordinates_json = json.dumps(
-                    player_coordinates["player_coordinates"]
-                )
+            # set before the first shooter hears it may fire
+            self.__rules.start(starting_client_turn)
+            # send player's coordinates to the other player, unless one of them already ended the game;
+            # the client draws the opponent's board from them, so even authoritative games reveal
+            # both fleets to the players: a known limit of the protocol
+            for player_coordinates in ([] if self.__rules.isOver() else players_coordinates):
                 if player_coordinates["player_index"] == 0:
                     self.gameServer.broadcast(
-                        coordinates_json.encode(), [player2]
+                        player_coordinates["player_coordinates"], [player2]
                     )
                 else:
                     self.gameServer.broadcast(
-                        coordinates_json.encode(), [player1]
+                        player_coordinates["player_coordinates"], [player1]
                     )
+            self.__play()
+        except KeyboardInterrupt:
+            self.gameServer._close_server()
 
-            # assign a thread for each player to receive and forward attacks and attack statuses
-            player1_attacks_handler = threading.Thread(
-                target=self.___handle_client, args=(player1,))
-            player2_attacks_handler = threading.Thread(
-                target=self.___handle_client, args=(player2,))
+    def __call_off(self):
+        # whoever did not leave for a saved game looks for another opponent
+        for player in self.players:
+            if player not in self.__resumed:
+                self.gameServer.return_to_lobby(player)
+        self.game_close_event.set()
+        self.metrics.games_finished.inc()
+        with self.gameServer.lock:
+            self.gameServer.games.remove(self)
 
-            player1_attacks_handler.start()
-            player2_attacks_handler.start()
+    def resume_game(self, turn: int):
+        # both players are back after a restart: boards as saved and the same player to fire
+        self.__rules = Rules(self.config, self.authoritative,
+                             [player.getField() for player in self.players])
+        self.__rules.setTurn(turn)
+        try:
+            for player in self.players:
+                self.gameServer.send_message(
+                    player,
+                    {
+                        "type": "resume_game",
+                        "config": self.config.to_message(),
+                        "authoritative": self.authoritative,
+                        "session": player.getSession(),
+                        "field": player.getField().to_snapshot(),
+                        "opponent_field": self.getOpponent(player).getField().to_snapshot(),
+                        "your_turn": int(self.getSlot(player) == turn)
+                    }
+                )
+            self.__play()
+        except KeyboardInterrupt:
+            self.gameServer._close_server()
 
-            # wait for both threads to finish
-            player1_attacks_handler.join()
-            player2_attacks_handler.join()
+    def __play(self):
+        player1, player2 = self.players
+        # assign a thread for each player to receive and forward attacks and attack statuses
+        player1_attacks_handler = threading.Thread(
+            target=self.___handle_client, args=(player1,))
+        player2_attacks_handler = threading.Thread(
+            target=self.___handle_client, args=(player2,))
 
-            player1.getBlockingEvent().set()
-            player2.getBlockingEvent().set()
+        player1_attacks_handler.start()
+        player2_attacks_handler.start()
 
-            # FIXME: the client is being removed from the list early
-            # so an error appears at the end of the game
-            # self.gameServer._disconnect_client(player1)
-            # self.gameServer._disconnect_client(player2)
+        # wait for both threads to finish
+        player1_attacks_handler.join()
+        player2_attacks_handler.join()
 
-            self.game_close_event.set()
-            self.gameServer.games.remove(self)
-            return
-        except KeyboardInterrupt:
-            self.gameServer._close_server()
+        # FIXME: the client is being removed from the list early
+        # so an error appears at the end of the game
+        # self.gameServer._disconnect_client(player1)
+        # self.gameServer._disconnect_client(player2)
+
+        self.game_close_event.set()
+        self.metrics.games_finished.inc()
+        self.gameServer.games.remove(self)
 
     def addPlayer(self, player: Client):
         if len(self.players) < 2:
             self.logger.info(f"Adding new player to the game N°{self.id}")
+            self.__slots[player.getId()] = len(self.players)
             self.players.append(player)
         else:
             raise TooManyPlayersError(
                 f"Number of players inside Game N°{self.id} exceeded")
 
+    def getSlot(self, client: Client) -> int:
+        return self.__slots[client.getId()]
+
+    def getOpponent(self, client: Client) -> Client:
+        return self.players[1 - self.__slots[client.getId()]]
+
+    def to_snapshot(self) -> Optional[str]:
+        # nothing to resume before both fleets are down, once it is over or against a bot
+        rules = self.__rules
+        if rules is None or rules.getTurn() is None or rules.isOver() or any(player.isBot() for player in self.players):
+            return None
+        with self.lock:
+            if self.__snapshot is None:
+                self.__snapshot = json.dumps({
+                    "turn": rules.getTurn(),
+                    "players": [
+                        {
+                            "session": player.getSession(),
+                            "rating": player.getRating(),
+                            "field": player.getField().to_snapshot()
+                        }
+                        for player in self.players
+                    ]
+                }, separators=(",", ":"))
+            return self.__snapshot
+
     def ___handle_client(self, client: Client):
         # handle incoming messages for each client
         try:
             while not self.game_close_event.is_set():
-                data = client.getSocket().recv(2048)
-                if not data:
+                message = client.getReader().receive()
+                if message is None:
                     return
                 else:
-                    message = json.loads(data.decode())
                     message_type = message["type"]
+                    label = message_type if message_type in MESSAGE_TYPES else "other"
+                    self.metrics.messages.inc(type=label)
+                    started = perf_counter()
                     if message_type == "attack":
                         self.logger.info(
                             f"Received attack coordinates from player {client.getAddress()}")
@@ -347,50 +904,64 @@ class Game:
                         self.logger.info(
                             f"Received attack status from player {client.getAddress()}")
                         self.__handle_receive_attack_status(client, message)
+                    elif message["type"] == "hello":
+                        self.__handle_hello(client, message)
                     elif message["type"] == "close":
                         self.gameServer._disconnect_client(client)
                     elif message["type"] == "exit":
                         self.__handle_close(client)
+                    self.metrics.message_handling.observe(
+                        perf_counter() - started, type=label)
         except socket.error as e:
             # send a close signal to client's socket when ERROR
             self.logger.warning(f"Error handling client: {e}")
             # close connection with client on ERROR
-            with self.gameServer.lock:
-                self.gameServer.getClients().remove(client)
-        except json.JSONDecodeError as e:
+            self.gameServer.remove_client(client)
+        except (DecodeError, FrameTooLargeError) as e:
             self.logger.warning(f"Error: {e}")
         except KeyboardInterrupt:
             self.__handle_close(client)
 
     def __handle_receive_coordinates(self, client: Client, players_coordinates: list, starting_client_turn: int):
         try:
-            client.getBlockingEvent().set()
-            data = client.getSocket().recv(2048)
-            message = json.loads(data.decode())
+            message = client.getReader().receive()
+            # the codec negotiation answer comes before the fleet, so does a claim on a saved seat
+            # the lobby had no time to read
+            while message is not None and message["type"] in ("hello", "resume"):
+                self.metrics.messages.inc(type=message["type"])
+                self.__handle_hello(client, message)
+                if message["type"] == "resume" and self.gameServer.resume_client(client, message.get("session")):
+                    self.__resumed.append(client)
+                    return
+                message = client.getReader().receive()
+            if message is None:
+                return
+            if message["type"] in MESSAGE_TYPES:
+                self.metrics.messages.inc(type=message["type"])
             if message["type"] == "coordinates":
                 self.logger.info(
                     f"Received coordinates from player {client.getAddress()}")
-                # place client's ships
-                for ship in message["ships"]:
-                    client.getField().place_ship(
-                        ship=Ship(
-                            ship["name"], ship["sign"], ship["height"], ship["width"]
-                        ),
-                        place_coordinates=(
-                            ship["x_start"]+1, ship["y_start"]+1
-                        ),
-                        orientation=ship["orientation"]
-                    )
-                # clients_start_index = len(
-                #     self.gameServer.getClients()) - (len(self.gameServer.games))
-                if self.gameServer.getClients().index(client) == starting_client_turn:
-                    message["starting"] = 1
-                else:
-                    message["starting"] = 0
+                with self.lock:
+                    # a rejected opponent has already ended the game
+                    if self.__rules.isOver():
+                        return
+                    try:
+                        player_coordinates = self.__rules.place_fleet(
+                            self.getSlot(client), message, starting_client_turn)
+                    except InvalidFleetError as e:
+                        self.logger.warning(
+                            f"Rejected the fleet of player {client.getAddress()}: {e}")
+                        replies = self.__rules.reject_fleet(self.getSlot(client))
+                    else:
+                        replies = None
+                if replies is not None:
+                    self.__send_replies(replies)
+                    self.gameServer._disconnect_client(client)
+                    return
                 players_coordinates.append(
                     {
-                        "player_index": self.gameServer.getClients().index(client),
-                        "player_coordinates": message
+                        "player_index": self.getSlot(client),
+                        "player_coordinates": player_coordinates
                     }
                 )
             elif message["type"] == "close":
@@ -400,72 +971,50 @@ class Game:
             else:
                 raise Exception(
                     f"Unexpected message received from player {client.getAddress()}")
-        except json.JSONDecodeError:
+        except (DecodeError, FrameTooLargeError):
             pass
 
-    def __handle_receive_attack(self, client: Client, message):
-        client_index = self.gameServer.getClients().index(client)
-        opponent = self.gameServer.getClients()[1-client_index]
-        opponent.getField().hit_ship(
-            message["coordinate"]["x"], message["coordinate"]["y"]
-        )
-        opponent.getSocket().send(json.dumps(message).encode())
+    def __handle_hello(self, client: Client, message):
+        client.setCodec(negotiate(message.get("codecs", [])))
+        self.logger.info(
+            f"Player {client.getAddress()} speaks {client.getCodec()}")
 
-    def __handle_receive_attack_status(self, client: Client, message):
-        client_index = self.gameServer.getClients().index(client)
-        opponent = self.gameServer.getClients()[1-client_index]
-
-        player_damaged_coordinates_count = client.getField().count_damaged_coordinates()
-        opponent_damaged_coordinates_count = opponent.getField().count_damaged_coordinates()
-
-        if player_damaged_coordinates_count >= MAX_DAMAGED_COORDINATES or opponent_damaged_coordinates_count >= MAX_DAMAGED_COORDINATES:
-            player_is_win = int(player_damaged_coordinates_count <=
-                                opponent_damaged_coordinates_count)
-            opponent_is_win = int(
-                opponent_damaged_coordinates_count <= player_damaged_coordinates_count)
-            if player_is_win != opponent_is_win:
-                client.getSocket().send(
-                    json.dumps({
-                        "type": "end_game",
-                        "is_win": player_is_win,
-                        "message": "You lost. Better luck next time :`(" if player_is_win == 0 else "Bravo. You win !!!",
-                    }).encode()
-                )
-                opponent.getSocket().send(
-                    json.dumps({
-                        "type": "end_game",
-                        "is_win": opponent_is_win,
-                        "message": "You lost. Better luck next time :`(" if opponent_is_win == 0 else "Bravo. You win !!!",
-                        "attack_status": message
-                    }).encode()
-                )
-                self.logger.info(f"{client.getAddress()} VS {opponent.getAddress(
-                )} --> {client.getAddress() if player_is_win else opponent.getAddress()} has won the battle")
+    def __handle_receive_attack(self, client: Client, message):
+        with self.lock:
+            replies = self.__rules.attack(self.getSlot(client), message)
+            if replies is None:
+                self.logger.warning(
+                    f"Ignored an attack out of turn from player {client.getAddress()}")
                 return
+            self.__attack_received_at = perf_counter()
+            self.__snapshot = None
+        self.__send_replies(replies)
+        if self.authoritative:
+            self.__observe_turn()
 
-        opponent.getSocket().send(json.dumps(message).encode())
-        client.getSocket().send(
-            json.dumps(
-                {
-                    "type": "launch_hit"
-                }
-            ).encode()
-        )
+    def __handle_receive_attack_status(self, client: Client, message):
+        self.__send_replies(
+            self.__rules.attack_status(self.getSlot(client), message))
+        self.__observe_turn()
+
+    def __send_replies(self, replies: Replies):
+        for slot, reply in replies:
+            self.gameServer.send_message(self.players[slot], reply)
+        winner = self.__rules.getWinner()
+        if winner is not None and any(reply["type"] == "end_game" for _, reply in replies):
+            player1, player2 = self.players
+            self.logger.info(f"{player1.getAddress()} VS {player2.getAddress(
+            )} --> {self.players[winner].getAddress()} has won the battle")
+
+    def __observe_turn(self):
+        # a finished game has no next turn to time
+        if self.__attack_received_at is not None and not self.__rules.isOver():
+            self.metrics.turn_round_trip.observe(
+                perf_counter() - self.__attack_received_at)
+            self.__attack_received_at = None
 
     def __handle_close(self, client: Client):
-        client_index = self.gameServer.getClients().index(client)
-        opponent = self.gameServer.getClients()[
-            1 - client_index
-        ]
-        opponent.getSocket().send(
-            json.dumps(
-                {
-                    "type": "end_game",
-                    "is_win": int(True),
-                    "message": "Your opponent has quit the game. You win :)"
-                }
-            ).encode()
-        )
+        self.__send_replies(self.__rules.quit(self.getSlot(client)))
         self.gameServer._disconnect_client(client)
 
     def __eq__(self, game):
@@ -475,9 +1024,26 @@ class Game:
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--snapshot-path",
+                        help="file the games in progress are saved to and resumed from")
+    parser.add_argument("--snapshot-interval", type=float,
+                        help="seconds between two saves, only on shutdown when omitted")
+    parser.add_argument("--resume-window", type=float, default=DEFAULT_RESUME_WINDOW,
+                        help="seconds players of a saved game get to come back")
+    args = parser.parse_args()
     close_event = threading.Event()
 
-    server = Server(("127.0.0.1", 12345), close_event)
+    server = Server(("127.0.0.1", 12345), close_event, snapshot_path=args.snapshot_path,
+                    snapshot_interval=args.snapshot_interval, resume_window=args.resume_window)
+
+    def shut_down(signum, frame):
+        # the last snapshot is written before the clients are let go
+        if not close_event.is_set():
+            server._close_server()
+
+    signal.signal(signal.SIGINT, shut_down)
+    signal.signal(signal.SIGTERM, shut_down)
     start_thread = threading.Thread(target=server.start)
     try:
         start_thread.start()
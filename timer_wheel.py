@@ -0,0 +1,101 @@
+import itertools
+import logging
+import threading
+from time import monotonic
+from typing import Callable, Dict, Optional
+
+logging.basicConfig(level=logging.INFO,
+                    format='%(name)s: %(message)s',
+                    )
+
+DEFAULT_TICK = 0.1
+DEFAULT_SLOTS = 512
+
+
+class Timer:
+    def __init__(self, id: int, callback: Callable[[], None], rounds: int, interval: Optional[float]):
+        self.id = id
+        self.callback = callback
+        # full turns of the wheel left before the timer is due
+        self.rounds = rounds
+        self.interval = interval
+        self.slot = 0
+
+
+class TimerWheel:
+    def __init__(self, tick: float = DEFAULT_TICK, slots: int = DEFAULT_SLOTS):
+        self.__tick = tick
+        self.__slots: list[Dict[int, Timer]] = [dict() for _ in range(slots)]
+        self.__timers: Dict[int, Timer] = dict()
+        self.__cursor = 0
+        self.__ids = itertools.count(1)
+        self.__lock = threading.Lock()
+        self.__close_event = threading.Event()
+        self.__thread: Optional[threading.Thread] = None
+        self.logger = logging.getLogger("TimerWheel")
+
+    def getTick(self):
+        return self.__tick
+
+    def __len__(self):
+        return len(self.__timers)
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        self.__close_event.set()
+
+    def schedule(self, delay: float, callback: Callable[[], None], interval: float = None) -> int:
+        # a repeating timer is re-armed every `interval` seconds until it is cancelled
+        with self.__lock:
+            timer = Timer(next(self.__ids), callback, 0, interval)
+            self.__insert(timer, delay)
+            self.__timers[timer.id] = timer
+            return timer.id
+
+    def cancel(self, timer_id: int) -> bool:
+        with self.__lock:
+            timer = self.__timers.pop(timer_id, None)
+            if timer is None:
+                return False
+            del self.__slots[timer.slot][timer_id]
+            return True
+
+    def __insert(self, timer: Timer, delay: float):
+        ticks = max(1, round(delay / self.__tick))
+        timer.rounds, offset = divmod(ticks - 1, len(self.__slots))
+        timer.slot = (self.__cursor + offset + 1) % len(self.__slots)
+        self.__slots[timer.slot][timer.id] = timer
+
+    def __advance(self):
+        expired = []
+        with self.__lock:
+            self.__cursor = (self.__cursor + 1) % len(self.__slots)
+            slot = self.__slots[self.__cursor]
+            for timer in list(slot.values()):
+                if timer.rounds > 0:
+                    timer.rounds -= 1
+                    continue
+                del slot[timer.id]
+                expired.append(timer)
+                if timer.interval is None:
+                    del self.__timers[timer.id]
+                else:
+                    self.__insert(timer, timer.interval)
+        for timer in expired:
+            try:
+                timer.callback()
+            except Exception as e:
+                self.logger.error(f"Error running timer {timer.id}: {e}")
+
+    def __run(self):
+        next_tick = monotonic() + self.__tick
+        while not self.__close_event.is_set():
+            now = monotonic()
+            # catch up on every tick missed while callbacks were running
+            while next_tick <= now:
+                self.__advance()
+                next_tick += self.__tick
+            self.__close_event.wait(next_tick - monotonic())